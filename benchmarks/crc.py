@@ -0,0 +1,50 @@
+# So sánh crc16_ccitt cũ (từng bit) với bản hiện tại (binascii.crc_hqx).
+# Chạy từ thư mục gốc: python -m benchmarks.crc
+import random, time
+from vietqr.crc import crc16_ccitt
+
+
+def legacy_crc16_ccitt(data):
+    crc = 0xFFFF
+    for b in data.encode():
+        crc ^= b << 8
+        for _ in range(8):
+            crc = (crc << 1) ^ 0x1021 if crc & 0x8000 else crc << 1
+            crc &= 0xFFFF
+    return f"{crc:04X}"
+
+
+def sample_payloads(count, seed=0):
+    # Payload thật của build_vietqr_payload tới trước "6304": chung tiền tố, khác tài khoản/nội dung
+    rnd = random.Random(seed)
+    p = lambda tag, value: f"{tag}{len(value):02d}{value}"
+    out = []
+    for _ in range(count):
+        account = str(rnd.randrange(10**12, 10**13))
+        acc_info = p("00", "970418") + p("01", account)
+        payload = p("00", "01") + p("01", "12")
+        payload += p("38", p("00", "A000000727") + p("01", acc_info) + p("02", "QRIBFTTA"))
+        payload += p("52", "0000") + p("53", "704") + p("58", "VN")
+        payload += p("62", p("08", f"TT HD{rnd.randrange(10**6):06d}")) + "6304"
+        out.append(payload)
+    return out
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main(count=20000):
+    payloads = sample_payloads(count)
+    t_old, expected = timed(lambda: [legacy_crc16_ccitt(x) for x in payloads])
+    t_table, table = timed(lambda: [crc16_ccitt(x) for x in payloads])
+    assert table == expected
+    print(f"{count} payload, {len(payloads[0])} byte")
+    for label, t in [("từng bit (cũ)", t_old), ("crc_hqx", t_table)]:
+        print(f"{label:<16}{t * 1000:>9.1f} ms  {count / t:>12,.0f} payload/s  x{t_old / t:.1f}")
+
+
+if __name__ == "__main__":
+    main()
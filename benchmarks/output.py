@@ -0,0 +1,27 @@
+# Thời gian nén và dung lượng ảnh theo từng định dạng đầu ra, cho mỗi mẫu.
+# Chạy từ thư mục gốc: python -m benchmarks.output
+from vietqr.output import available_formats, encode_stats
+from vietqr.payload import build_vietqr_payload
+from vietqr.render import TEMPLATES, render_template
+
+ARGS = ("NGUYEN VAN A", "1234567890", "Tạp hoá Minh Anh", "Lê Thị Liên", "0976.239.278")
+
+
+def main(repeat=3):
+    data = build_vietqr_payload("1234567890", "970418", "thanh toan")
+    for template in TEMPLATES:
+        render_template(template, data, *ARGS)  # làm nóng cache tài nguyên
+    print(f"{'mẫu':<12}{'định dạng':<10}{'nén (ms)':>10}{'KB':>9}")
+    for template in TEMPLATES:
+        for fmt in available_formats():
+            before = encode_stats().get(fmt, {"count": 0, "seconds": 0.0, "bytes": 0})
+            for _ in range(repeat):
+                render_template(template, data, *ARGS, fmt=fmt)
+            after = encode_stats()[fmt]
+            ms = (after["seconds"] - before["seconds"]) / repeat * 1000
+            kb = (after["bytes"] - before["bytes"]) / repeat / 1024
+            print(f"{template:<12}{fmt:<10}{ms:>10.1f}{kb:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
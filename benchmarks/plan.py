@@ -0,0 +1,58 @@
+# Số QR số tiền động mỗi giây cho một merchant: đường cũ (build_vietqr_payload +
+# render_template) so với MerchantPlan (tiền tố payload + CRC và nền có chữ làm sẵn):
+# cả ảnh (render) và chỉ ảnh QR để dán lên nền đã tải (tile).
+# Mỗi giao dịch một số tiền khác nhau, nên không trúng cache mã hoá QR.
+# Chạy từ thư mục gốc: python -m benchmarks.plan [-t tingbox] [-n 200]
+import argparse, time
+from vietqr.payload import build_vietqr_payload
+from vietqr.plan import MerchantPlan
+from vietqr.qr import encode_matrix
+from vietqr.render import render_template
+
+ACCOUNT, BANK_BIN = "1234567890", "970418"
+NAMES = ("NGUYEN VAN A", ACCOUNT, "TẠP HOÁ MINH ANH", "Lê Thị Liên", "0976.239.278")
+
+
+def rate(fn, count):
+    start = time.perf_counter()
+    for i in range(count):
+        fn(i)
+    elapsed = time.perf_counter() - start
+    return count / elapsed, elapsed / count * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Đo tốc độ tạo QR số tiền động cho một merchant")
+    parser.add_argument("-t", "--template", default="tingbox")
+    parser.add_argument("-n", "--count", type=int, default=200, help="số giao dịch mỗi phép đo ảnh")
+    args = parser.parse_args(argv)
+
+    acc_name, account, store, support_name, support_phone = NAMES
+    note = lambda i: f"TT DON {i:06d}"
+    amount = lambda i: str(10000 + i)
+    print(f"Mẫu {args.template}, {args.count} giao dịch mỗi phép đo ảnh")
+
+    rows = []
+    plan = MerchantPlan(args.template, ACCOUNT, BANK_BIN, acc_name, store, support_name, support_phone)
+    n = args.count * 100
+    rows.append(("payload cũ", *rate(lambda i: build_vietqr_payload(ACCOUNT, BANK_BIN, note(i), amount(i)), n)))
+    rows.append(("payload plan", *rate(lambda i: plan.payload(amount(i), note(i)), n)))
+    # Mã hoá QR (qrcode, chọn version + mask) - phần không làm trước được của mỗi giao dịch
+    rows.append(("mã hoá QR", *rate(lambda i: encode_matrix(plan.payload(amount(i + n), note(i))), args.count)))
+    for fmt in ("png", "preview"):
+        plan = MerchantPlan(args.template, ACCOUNT, BANK_BIN, acc_name, store, support_name, support_phone, fmt)
+        offset = (2 if fmt == "png" else 5) * n  # số tiền chưa gặp, không trúng cache encode_matrix
+        old = lambda i: render_template(args.template, build_vietqr_payload(ACCOUNT, BANK_BIN, note(i), amount(i + offset)),
+                                        acc_name, account, store, support_name, support_phone, fmt).getvalue()
+        new = lambda i: plan.render(amount(i + offset + n), note(i)).getvalue()
+        tile = lambda i: plan.tile(amount(i + offset + 2 * n), note(i)).getvalue()
+        rows.append((f"ảnh {fmt} cũ", *rate(old, args.count)))
+        rows.append((f"ảnh {fmt} plan", *rate(new, args.count)))
+        rows.append((f"ảnh QR {fmt} plan", *rate(tile, args.count)))
+
+    for label, per_s, ms in rows:
+        print(f"{label:<20}{per_s:>12,.0f} /s {ms:>10.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
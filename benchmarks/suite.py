@@ -0,0 +1,233 @@
+# Bộ đo hiệu năng các hàm thật: CRC, tạo/đọc payload, mã hoá QR, 6 mẫu ảnh, đọc QR từ ảnh.
+# Ghi kết quả ra JSON; so với lần chạy trước và báo lỗi nếu chậm/tốn bộ nhớ hơn ngưỡng.
+# Chạy từ thư mục gốc:
+#   python -m benchmarks.suite -o bench.json
+#   python -m benchmarks.suite -o new.json --compare bench.json --threshold 1.25
+#
+# Mỗi ca được chạy một lần làm nóng (font, nền, lớp tĩnh đã nạp - đúng như khi
+# app chạy lâu), rồi đo `repeat` lần không qua cache ảnh. Bộ nhớ đỉnh đo bằng
+# tracemalloc trong một lần chạy riêng (gồm Python và NumPy; bộ nhớ điểm ảnh
+# của Pillow không được tracemalloc theo dõi).
+import argparse, json, os, platform, statistics, sys, time, tracemalloc
+from datetime import datetime, timezone
+from importlib import metadata
+
+import cv2
+import numpy as np
+import qrcode
+
+from vietqr.assets import asset_cache, asset_version
+from vietqr.crc import crc16_ccitt
+from vietqr.decode import decode_qr, decode_qr_multi
+from vietqr.payload import build_vietqr_payload, extract_vietqr_info, parse_tlv
+from vietqr.qr import ERROR_CORRECTION, QR_MASK, encode_matrix
+from vietqr.render import RENDER_VERSION, TEMPLATES, render_template
+from vietqr.tlv import parse_vietqr
+
+SHORT = ("NGUYEN VAN A", "1234567890", "TẠP HOÁ MINH ANH")
+LONG = ("CÔNG TY TNHH THƯƠNG MẠI DỊCH VỤ XUẤT NHẬP KHẨU HOÀNG PHÁT THÁI BÌNH", "12345678901234567890",
+        "HỘ KINH DOANH CỬA HÀNG VẬT LIỆU XÂY DỰNG VÀ TRANG TRÍ NỘI THẤT NGUYỄN THỊ THANH HƯƠNG")
+STAFF = ("Lê Thị Liên", "0976.239.278")
+NO_STAFF = ("", "")
+
+PAYLOAD = build_vietqr_payload("1234567890", "970418", "thanh toan don hang", "150000")
+
+
+# ----- Ảnh mẫu để đọc QR -----
+def _encode(img, ext=".png", **params):
+    flags = [cv2.IMWRITE_JPEG_QUALITY, params["quality"]] if "quality" in params else []
+    return cv2.imencode(ext, img, flags)[1].tobytes()
+
+
+def decode_corpus():
+    qr = cv2.imdecode(np.frombuffer(render_template("thantai", PAYLOAD, *SHORT, *STAFF).getvalue(), np.uint8),
+                      cv2.IMREAD_COLOR)
+    h, w = qr.shape[:2]
+    rng = np.random.default_rng(0)
+    corpus = {"clean_png": _encode(qr)}
+    m = cv2.getRotationMatrix2D((w / 2, h / 2), 30, 1.0)
+    corpus["rotated_jpeg"] = _encode(cv2.warpAffine(qr, m, (w, h), borderValue=(255, 255, 255)), ".jpg", quality=85)
+    corpus["low_contrast_jpeg"] = _encode((qr * 0.25 + 140).astype(np.uint8), ".jpg", quality=85)
+    corpus["small_png"] = _encode(cv2.resize(qr, None, fx=0.18, fy=0.18, interpolation=cv2.INTER_AREA))
+    scene = cv2.GaussianBlur(rng.integers(60, 200, (3000, 4000, 3), dtype=np.uint8), (31, 31), 0)
+    scene[500:2487, 1300:2700] = cv2.resize(qr, (1400, 1987))
+    corpus["photo_12mp_jpeg"] = _encode(scene, ".jpg", quality=90)
+    sheet = np.full((1100, 1500, 3), 255, np.uint8)
+    sheet[30:1050, 20:740] = cv2.resize(qr, (720, 1020))
+    other = build_vietqr_payload("9876543210", "970418", "", "")
+    qr2 = cv2.imdecode(np.frombuffer(render_template("thantai", other, *SHORT).getvalue(), np.uint8), cv2.IMREAD_COLOR)
+    sheet[30:1050, 760:1480] = cv2.resize(qr2, (720, 1020))
+    corpus["sheet_two_codes_jpeg"] = _encode(sheet, ".jpg", quality=90)
+    corpus["no_qr_png"] = _encode(np.full((800, 800, 3), 230, np.uint8))
+    return corpus
+
+
+# ----- Các ca đo: tên -> hàm trả về kết quả (bytes/str/...) -----
+def cases():
+    out = {
+        "crc16_ccitt": lambda: crc16_ccitt(PAYLOAD[:-4]),
+        "build_vietqr_payload": lambda: build_vietqr_payload("1234567890", "970418", "thanh toan don hang", "150000"),
+        "parse_tlv": lambda: parse_tlv(PAYLOAD),
+        # parse_vietqr được cache theo payload: xoá cache để đo đúng một lần tách
+        "extract_vietqr_info": lambda: (parse_vietqr.cache_clear(), extract_vietqr_info(PAYLOAD))[1],
+        "parse_vietqr": lambda: (parse_vietqr.cache_clear(), parse_vietqr(PAYLOAD))[1],
+        # Mã hoá QR (version + mask) cũng được cache theo payload
+        "encode_matrix": lambda: (encode_matrix.cache_clear(), encode_matrix(PAYLOAD))[1].modules,
+    }
+    for template in TEMPLATES:
+        for names_label, names in (("short", SHORT), ("long", LONG)):
+            for staff_label, staff in (("staff", STAFF), ("no_staff", NO_STAFF)):
+                if template == "logo" and (names_label, staff_label) != ("short", "no_staff"):
+                    continue  # mẫu logo không có chữ
+                out[f"render.{template}.{names_label}.{staff_label}"] = (
+                    lambda t=template, n=names, s=staff: render_template(t, PAYLOAD, *n, *s).getvalue())
+    for name, data in decode_corpus().items():
+        decode = decode_qr_multi if "codes" in name else decode_qr
+        out[f"decode.{name}"] = lambda d=data, f=decode: f(d)
+    return out
+
+
+def check_qr_matches_qrcode(count=60):
+    # encode_matrix dùng phần bên trong của qrcode (best_fit, setup_*, util.create_data,
+    # data_list); sau khi nâng qrcode phải ra đúng ma trận của QRCode.make(fit=True)
+    if QR_MASK is not None:
+        return  # mask cố định thì khác ảnh là đúng
+    for i in range(count):
+        note = "THANH TOAN DON HANG so 123 abc"[:i % 31] * (1 + i // 31)
+        data = build_vietqr_payload(str(10**9 + i * 7919), "970418", note, str(i * 1500) if i % 3 else "")
+        qr = qrcode.QRCode(error_correction=ERROR_CORRECTION, border=0)
+        qr.add_data(data)
+        qr.make(fit=True)
+        expected = bytes(int(cell) for row in qr.get_matrix() for cell in row)
+        assert encode_matrix(data).modules == expected, f"encode_matrix khác qrcode {metadata.version('qrcode')}: {data}"
+
+
+def layer_reuse(count=40):
+    # Nhiều merchant tên dài ngắn khác nhau (cỡ chữ co khác nhau), cùng một cán bộ
+    # hỗ trợ: mỗi mẫu chỉ được dựng một lớp nền tĩnh, mọi lần vẽ sau phải dùng lại
+    names = [(LONG[0][:12 + i * 3], LONG[1][:6 + i % 15], LONG[2][:10 + i * 2]) for i in range(count)]
+    out = {}
+    for template in TEMPLATES:
+        if template == "logo":
+            continue
+        before = asset_cache.stats()
+        for i, n in enumerate(names):
+            render_template(template, build_vietqr_payload(n[1], "970418", "", str(1000 + i)), *n, *STAFF)
+        after = asset_cache.stats()
+        out[template] = {"renders": count, "layers": after["layers"] - before["layers"],
+                         "evictions": after["evictions"] - before["evictions"]}
+    return out
+
+
+def _size(result):
+    # Dung lượng đầu ra; với đọc QR là tổng độ dài payload đọc được (0 = không đọc được)
+    if isinstance(result, (bytes, str)):
+        return len(result)
+    if hasattr(result, "data"):
+        return len(result.data or "")
+    if isinstance(result, list):
+        return sum(_size(r) or 0 for r in result)
+    return None
+
+
+def measure(fn, repeat):
+    fn()  # làm nóng
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "runs": repeat,
+        "min_ms": round(min(times) * 1000, 4),
+        "median_ms": round(statistics.median(times) * 1000, 4),
+        "peak_kb": round(peak / 1024, 1),
+        "bytes": _size(result),
+    }
+
+
+def _repeat_for(name, base):
+    # Hàm nhỏ (µs) chạy nhiều lần hơn để số đo ổn định
+    return base * 200 if not name.startswith(("render.", "decode.")) else base
+
+
+def run(filter_=None, repeat=5):
+    results = {}
+    for name, fn in cases().items():
+        if filter_ and filter_ not in name:
+            continue
+        results[name] = measure(fn, _repeat_for(name, repeat))
+        r = results[name]
+        print(f"{name:<40}{r['median_ms']:>11.3f} ms{r['peak_kb']:>11.0f} KB{r['bytes'] or 0:>10}", file=sys.stderr)
+    return {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "asset_version": asset_version(),
+            "render_version": RENDER_VERSION,
+        },
+        "cases": results,
+    }
+
+
+def compare(current, baseline, threshold):
+    # Trả về danh sách ca chậm hơn/tốn bộ nhớ hơn baseline quá ngưỡng. So thời gian
+    # nhỏ nhất (ít nhiễu nhất khi máy đang bận việc khác), không phải trung vị.
+    regressions = []
+    for name, now in current["cases"].items():
+        before = baseline["cases"].get(name)
+        if not before:
+            continue
+        if name.startswith("decode.") and before.get("bytes") and not now.get("bytes"):
+            regressions.append((name, "bytes", before["bytes"], 0))  # trước đọc được, giờ không
+        for metric in ("min_ms", "peak_kb"):
+            old, new = before.get(metric), now.get(metric)
+            # Bỏ qua số đo quá nhỏ, dao động ngẫu nhiên lớn hơn chính giá trị đo
+            floor = 0.05 if metric == "min_ms" else 64
+            if old and new and max(old, new) >= floor and new > old * threshold:
+                regressions.append((name, metric, old, new))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Đo hiệu năng VietQR, ghi JSON và so với lần chạy trước")
+    parser.add_argument("-o", "--output", default=None, help="ghi kết quả ra file JSON")
+    parser.add_argument("-k", "--filter", default=None, help="chỉ chạy các ca có tên chứa chuỗi này")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="số lần đo mỗi ca ảnh/đọc QR")
+    parser.add_argument("--compare", default=None, help="file JSON của lần chạy trước")
+    parser.add_argument("--threshold", type=float, default=1.25, help="báo lỗi nếu chậm hơn N lần (mặc định 1.25)")
+    args = parser.parse_args(argv)
+
+    check_qr_matches_qrcode()
+    current = run(args.filter, args.repeat)
+    if not args.filter:
+        current["layer_reuse"] = layer_reuse()
+        rebuilt = {t: r for t, r in current["layer_reuse"].items() if r["layers"] > 1 or r["evictions"]}
+        for template, r in rebuilt.items():
+            print(f"❌ layer_reuse.{template}: {r['layers']} lớp nền, {r['evictions']} lần bỏ khỏi cache "
+                  f"cho {r['renders']} merchant cùng cán bộ hỗ trợ")
+        if rebuilt:
+            return 1
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.threshold)
+        for name, metric, old, new in regressions:
+            print(f"❌ {name}: {metric} {old} -> {new}" + (f" (x{new / old:.2f})" if new else ""))
+        if regressions:
+            return 1
+        print(f"✅ Không ca nào vượt ngưỡng x{args.threshold}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
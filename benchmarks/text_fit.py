@@ -0,0 +1,64 @@
+# So sánh vòng lặp get_font cũ với fit_font_size (tìm nhị phân + cache).
+# Chạy từ thư mục gốc: python -m benchmarks.text_fit
+import os, time
+from PIL import Image, ImageDraw, ImageFont
+from vietqr.assets import asset_cache
+from vietqr.text import fit_font_size, text_width
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets")
+FONT_PATH = os.path.join(ASSETS_DIR, "Roboto-Bold.ttf")
+
+# (mẫu, max_width, base_size, min_size, step) đúng như trong app.py
+TEMPLATES = [
+    ("qr_with_text", 867, 40, 20, 2),
+    ("background", 1007, 48, 12, 1),
+    ("thantai", 1007, 48, 12, 1),
+    ("loa", 560, 32, 20, 2),
+    ("tingbox", 460, 32, 12, 1),
+]
+
+NAMES = [
+    "NGUYEN VAN A",
+    "CÔNG TY TNHH THƯƠNG MẠI DỊCH VỤ XUẤT NHẬP KHẨU HOÀNG PHÁT THÁI BÌNH",
+    "HỘ KINH DOANH CỬA HÀNG VẬT LIỆU XÂY DỰNG VÀ TRANG TRÍ NỘI THẤT NGUYỄN THỊ THANH HƯƠNG",
+    "DOANH NGHIỆP TƯ NHÂN CHẾ BIẾN NÔNG LÂM THỦY HẢI SẢN XUẤT KHẨU ĐỒNG CHÂU TIỀN HẢI",
+    "12345678901234567890",
+]
+
+
+def legacy_fit(draw, text, max_width, base_size, min_size, step):
+    font_size = base_size
+    font = ImageFont.truetype(FONT_PATH, font_size)
+    width = draw.textbbox((0, 0), text, font=font)[2]
+    while width > max_width and font_size > min_size:
+        font_size -= step
+        font = ImageFont.truetype(FONT_PATH, font_size)
+        width = draw.textbbox((0, 0), text, font=font)[2]
+    return font_size
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main(repeat=20):
+    draw = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+    print(f"{'mẫu':<14}{'tên':<8}{'cũ (ms)':>10}{'lạnh (ms)':>11}{'nóng (ms)':>11}  cỡ")
+    for template, max_width, base, floor, step in TEMPLATES:
+        for i, name in enumerate(NAMES):
+            old_ms, old_size = timed(lambda: legacy_fit(draw, name, max_width, base, floor, step), repeat)
+
+            def cold():
+                asset_cache.clear(); text_width.cache_clear()
+                return fit_font_size(FONT_PATH, name, max_width, base, floor, step)
+            cold_ms, new_size = timed(cold, repeat)
+            warm_ms, _ = timed(lambda: fit_font_size(FONT_PATH, name, max_width, base, floor, step), repeat)
+            assert new_size == old_size, (template, name, old_size, new_size)
+            print(f"{template:<14}{'#' + str(i):<8}{old_ms:>10.3f}{cold_ms:>11.3f}{warm_ms:>11.4f}  {new_size}")
+
+
+if __name__ == "__main__":
+    main()
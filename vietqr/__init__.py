@@ -0,0 +1,2 @@
+# Thư viện lõi VietQR BIDV: cache tài nguyên, mã hoá QR, vẽ mẫu.
+# Không phụ thuộc Streamlit; OpenCV/NumPy chỉ được nạp ở lần đọc/vẽ ảnh đầu tiên.
@@ -0,0 +1,164 @@
+import base64, hashlib, os, threading
+from collections import OrderedDict
+from functools import lru_cache
+from PIL import Image, ImageFont
+from vietqr import trace
+from vietqr.atlas import open_atlas
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets")
+LOGO_PATH = os.path.join(ASSETS_DIR, "logo.png")
+LOGO_BIDV_PATH = os.path.join(ASSETS_DIR, "logo_bidv.png")
+FONT_PATH = os.path.join(ASSETS_DIR, "Roboto-Bold.ttf")
+FONT_LABELPATH = os.path.join(ASSETS_DIR, "RobotoCondensed-Regular.ttf")
+BG_PATHFIX = os.path.join(ASSETS_DIR, "backgroundfix.png")
+BG_PATH = os.path.join(ASSETS_DIR, "background.png")
+BG_THAI_PATH = os.path.join(ASSETS_DIR, "backgroundthantai.png")
+BG_LOA_PATH = os.path.join(ASSETS_DIR, "backgroundloa.png")
+BG_TINGBOX_PATH = os.path.join(ASSETS_DIR, "tingbox.png")
+BACKGROUNDS = (BG_PATHFIX, BG_PATH, BG_THAI_PATH, BG_LOA_PATH, BG_TINGBOX_PATH)  # có trong atlas (vietqr.atlas)
+
+# ======== Cache tài nguyên dùng chung cho toàn tiến trình ========
+# Ảnh nền, logo (kèm các bản đã resize) và font được giải mã một lần rồi
+# dùng lại cho mọi mẫu, mọi phiên. Ảnh trả về là bản dùng chung: không được
+# vẽ trực tiếp lên, cần .copy() trước khi paste/draw. Ảnh nền có trong atlas
+# (vietqr.atlas) được map thẳng từ file thay vì giải mã PNG.
+#
+# Ngân sách (VIETQR_ASSET_CACHE_MB) tính mọi ảnh được giữ lâu dài: nền, nền có
+# viền, lớp tĩnh, logo. Mẫu đã biên dịch (vietqr.engine) không giữ ảnh riêng mà
+# lấy lại từ đây, nên ảnh bị bỏ khỏi cache là được giải phóng thật. Ngoài ngân
+# sách chỉ còn ảnh đang vẽ dở và ảnh map từ atlas.
+
+DEFAULT_BUDGET = 256 * 1024 * 1024  # 256 MB
+
+
+class AssetCache:
+    def __init__(self, max_bytes=DEFAULT_BUDGET, use_atlas=True):
+        self.max_bytes = max_bytes
+        self.use_atlas = use_atlas
+        self._items = OrderedDict()  # key -> (obj, nbytes), thứ tự LRU
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _get(self, key, loader, sizer):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item[0]
+            self.misses += 1
+        # Giải mã ngoài khoá để các asset khác không phải chờ
+        obj = loader()
+        nbytes = sizer(obj)
+        with self._lock:
+            if key in self._items:
+                return self._items[key][0]
+            self._items[key] = (obj, nbytes)
+            self._bytes += nbytes
+            self._evict()
+        return obj
+
+    def _evict(self):
+        # Bỏ phần tử ít dùng nhất cho tới khi về dưới ngân sách (giữ lại phần tử mới nhất)
+        while self._bytes > self.max_bytes and len(self._items) > 1:
+            _, (_, nbytes) = self._items.popitem(last=False)
+            self._bytes -= nbytes
+            self.evictions += 1
+
+    def _atlas(self, path, scale):
+        atlas = open_atlas() if self.use_atlas else None
+        return atlas.image(path, scale) if atlas is not None else None
+
+    def image(self, path):
+        def load():
+            img = self._atlas(path, 1.0)
+            if img is not None:
+                return img
+            with trace.span("image_decode"), Image.open(path) as im:
+                return im.convert("RGBA")
+        return self._get(("image", path), load, _image_bytes)
+
+    def scaled(self, path, scale):
+        # Ảnh nền thu nhỏ cho chế độ xem trước (xem vietqr.output.format_scale)
+        def load():
+            img = self._atlas(path, scale)
+            if img is not None:
+                return img
+            img = self.image(path)
+            size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+            return img.resize(size, Image.LANCZOS)
+        return self._get(("scaled", path, scale), load, _image_bytes)
+
+    def padded(self, path, scale, pad):
+        # Ảnh nền (thu nhỏ nếu scale < 1) thêm viền trắng pad điểm ảnh mỗi phía
+        def load():
+            bg = self.image(path) if scale == 1.0 else self.scaled(path, scale)
+            img = Image.new("RGBA", (bg.width + 2 * pad, bg.height + 2 * pad), (255, 255, 255, 255))
+            img.paste(bg, (pad, pad))
+            return img
+        return self._get(("padded", path, scale, pad), load, _image_bytes)
+
+    def logo(self, path, size):
+        size = tuple(size)
+        return self._get(("logo", path, size), lambda: self.image(path).resize(size), _image_bytes)
+
+    def layer(self, key, build):
+        # Ảnh nền đã vẽ sẵn phần tĩnh (xem vietqr.engine), dùng chung ngân sách với ảnh gốc
+        return self._get(("layer",) + tuple(key), build, _image_bytes)
+
+    def font(self, path, size):
+        return self._get(("font", path, size), lambda: ImageFont.truetype(path, size),
+                         lambda f: os.path.getsize(path))
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "items": len(self._items),
+                "layers": sum(1 for key in self._items if key[0] == "layer"),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+
+def _image_bytes(img):
+    # Ảnh map từ atlas (chỉ đọc) nằm trong page cache của hệ điều hành, dùng chung
+    # giữa các tiến trình, nên không tính vào ngân sách
+    if img.readonly:
+        return 0
+    return img.width * img.height * len(img.getbands())
+
+
+asset_cache = AssetCache(int(os.environ.get("VIETQR_ASSET_CACHE_MB", 256)) * 1024 * 1024)
+
+
+@lru_cache(maxsize=None)
+def asset_version():
+    # Băm nội dung thư mục assets: đổi ảnh nền/font/logo thì cache ảnh cũ tự mất hiệu lực
+    digest = hashlib.sha1()
+    for name in sorted(os.listdir(ASSETS_DIR)):
+        path = os.path.join(ASSETS_DIR, name)
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                digest.update(name.encode() + b"\0" + f.read())
+    return digest.hexdigest()[:16]
+
+
+@lru_cache(maxsize=None)
+def data_uri(path, mime):
+    # Font/ảnh nhúng thẳng vào HTML/CSS của app, mã hoá base64 một lần cho cả tiến trình
+    with open(path, "rb") as f:
+        return f"data:{mime};base64,{base64.b64encode(f.read()).decode()}"
@@ -0,0 +1,168 @@
+import argparse, base64, hashlib, json, mmap, os, struct, sys, threading
+from functools import lru_cache
+from PIL import Image
+
+# ======== Atlas ảnh nền đã giải mã sẵn, map thẳng từ đĩa ========
+# Bước build giải mã các ảnh nền (cả bản thu nhỏ cho xem trước) thành RGBA thô
+# và ghi vào một file. Mỗi tiến trình mmap file đó chỉ đọc và bọc từng vùng
+# thành ảnh Pillow không chép (Image.frombuffer), nên trang nhớ được hệ điều
+# hành dùng chung giữa các tiến trình và lúc khởi động không phải giải nén PNG.
+#
+# Mỗi ảnh trong atlas ghi kèm SHA-1 của file PNG gốc; file gốc đã đổi (hoặc
+# atlas thiếu, hỏng, khác phiên bản định dạng) thì AssetCache giải mã PNG như
+# bình thường. Ảnh lấy từ atlas là ảnh chỉ đọc, đúng quy ước của AssetCache.
+# Thông tin kèm ảnh (img.info: ICC profile, dpi, ...) được ghi vào header và
+# gắn lại cho ảnh, để file ảnh xuất ra giống hệt lúc không có atlas.
+#
+#   VIETQR_ATLAS_PATH=/var/cache/vietqr/atlas.bin python -m vietqr.atlas
+#
+# Chỉ dùng khi đặt VIETQR_ATLAS_PATH (không có đường dẫn mặc định): ảnh trong
+# atlas được in thẳng lên QR thanh toán, nên file phải nằm ở thư mục chỉ tài
+# khoản chạy dịch vụ ghi được, không phải thư mục tạm dùng chung.
+#
+# Bố cục file: MAGIC, phiên bản, độ dài header (8s I I), header JSON, rồi dữ
+# liệu RGBA của từng ảnh, mỗi ảnh bắt đầu ở biên 4096 byte (offset trong header
+# tính từ đầu vùng dữ liệu).
+
+ATLAS_PATH = os.environ.get("VIETQR_ATLAS_PATH") or None
+ATLAS_VERSION = 2
+MAGIC = b"VQRATLAS"
+_HEADER = struct.Struct("<8sII")
+_ALIGN = 4096
+
+
+@lru_cache(maxsize=None)
+def source_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _aligned(n):
+    return -(-n // _ALIGN) * _ALIGN
+
+
+def _entry_key(path, scale):
+    return f"{os.path.basename(path)}@{float(scale)}"
+
+
+def _dump_info(info):
+    # img.info -> JSON; bỏ qua giá trị không ghi được (vd. khối photoshop)
+    out = {}
+    for key, value in info.items():
+        if not isinstance(key, str):
+            continue
+        if isinstance(value, bytes):
+            out[key] = {"bytes": base64.b64encode(value).decode()}
+        elif isinstance(value, tuple) and all(isinstance(v, (int, float)) for v in value):
+            out[key] = {"tuple": list(value)}
+        elif isinstance(value, (str, int, float)):
+            out[key] = value
+    return out
+
+
+def _load_info(info):
+    out = {}
+    for key, value in info.items():
+        if isinstance(value, dict):
+            value = base64.b64decode(value["bytes"]) if "bytes" in value else tuple(value["tuple"])
+        out[key] = value
+    return out
+
+
+class Atlas:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_len = _HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != ATLAS_VERSION:
+            raise ValueError(f"Atlas {path} không đúng định dạng/phiên bản {ATLAS_VERSION}")
+        self.path = path
+        self.entries = json.loads(self._map[_HEADER.size:_HEADER.size + header_len])
+        self._data_start = _aligned(_HEADER.size + header_len)
+        self._view = memoryview(self._map)  # không đóng map: ảnh đã cấp vẫn trỏ vào đây
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale = 0
+
+    def image(self, path, scale=1.0):
+        # Ảnh chỉ đọc trỏ thẳng vào vùng nhớ map, hoặc None nếu không có/đã cũ
+        entry = self.entries.get(_entry_key(path, scale))
+        if entry is None:
+            return None
+        if entry["sha1"] != source_digest(path):
+            with self._lock:
+                self.stale += 1
+            return None
+        width, height = entry["size"]
+        start = self._data_start + entry["offset"]
+        with self._lock:
+            self.hits += 1
+        img = Image.frombuffer("RGBA", (width, height), self._view[start:start + width * height * 4],
+                               "raw", "RGBA", 0, 1)
+        img.info.update(_load_info(entry["info"]))
+        return img
+
+    def stats(self):
+        with self._lock:
+            return {"path": self.path, "entries": len(self.entries), "hits": self.hits, "stale": self.stale}
+
+
+@lru_cache(maxsize=None)
+def open_atlas(path=ATLAS_PATH):
+    # Một lần cho mỗi tiến trình; không đặt đường dẫn hoặc không có atlas dùng được thì trả về None
+    if not path:
+        return None
+    try:
+        return Atlas(path)
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+def build(images, path):
+    # images: [(đường dẫn PNG gốc, tỉ lệ, ảnh RGBA)]; ghi ra file tạm rồi thay nguyên tử,
+    # tiến trình đang map bản cũ vẫn đọc bản cũ cho tới khi khởi động lại
+    entries = {}
+    offset = 0
+    for source, scale, img in images:
+        entries[_entry_key(source, scale)] = {"sha1": source_digest(source), "size": list(img.size),
+                                              "offset": offset, "info": _dump_info(img.info)}
+        offset += _aligned(img.width * img.height * 4)
+    header = json.dumps(entries).encode()
+    data_start = _aligned(_HEADER.size + len(header))
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, ATLAS_VERSION, len(header)) + header)
+        for source, scale, img in images:
+            f.seek(data_start + entries[_entry_key(source, scale)]["offset"])
+            f.write(img.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp, path)
+    return entries
+
+
+def main(argv=None):
+    from vietqr.assets import AssetCache, BACKGROUNDS
+    from vietqr.output import PREVIEW_SCALE
+
+    parser = argparse.ArgumentParser(description="Giải mã sẵn ảnh nền thành atlas RGBA để các tiến trình mmap dùng chung")
+    parser.add_argument("-o", "--output", default=ATLAS_PATH, help="file atlas (mặc định: VIETQR_ATLAS_PATH)")
+    args = parser.parse_args(argv)
+    if not args.output:
+        parser.error("cần -o hoặc biến môi trường VIETQR_ATLAS_PATH")
+
+    # Giải mã/thu nhỏ bằng đúng AssetCache (không qua atlas) để ảnh giống hệt lúc không có atlas
+    cache = AssetCache(use_atlas=False)
+    images = []
+    for path in BACKGROUNDS:
+        images.append((path, 1.0, cache.image(path)))
+        images.append((path, PREVIEW_SCALE, cache.scaled(path, PREVIEW_SCALE)))
+    entries = build(images, args.output)
+    total = os.path.getsize(args.output)
+    print(f"✅ {len(entries)} ảnh, {total / 1024 / 1024:.1f} MB -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
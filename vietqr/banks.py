@@ -0,0 +1,44 @@
+# ======== Mã BIN ngân hàng (NAPAS) ========
+BIDV_BIN = "970418"
+
+BANKS = {
+    "970418": "BIDV",
+    "970436": "Vietcombank",
+    "970415": "VietinBank",
+    "970405": "Agribank",
+    "970422": "MB Bank",
+    "970407": "Techcombank",
+    "970423": "TPBank",
+    "970424": "Shinhan Bank",
+    "970441": "VIB",
+    "970432": "VPBank",
+    "970443": "SHB",
+    "970431": "Eximbank",
+    "970438": "BaoVietBank",
+    "970454": "VietCapitalBank",
+    "970429": "SCB",
+    "970421": "VRB",
+    "970425": "ABBank",
+    "970412": "PVcomBank",
+    "970414": "OceanBank",
+    "970428": "NamABank",
+    "970437": "HDBank",
+    "970433": "VietBank",
+    "970459": "ABBANK",
+    "970448": "OCB",
+    "970409": "BacABank",
+    "970442": "Hong Leong Bank VN",
+    "970430": "PG Bank",
+    "970446": "Co-op Bank",
+    "422589": "CIMB VN",
+    "970434": "Indovina Bank",
+    "970457": "Woori VN",
+    "970458": "UOB VN",
+    "970466": "KEB Hana HCM",
+    "970467": "KEB Hana HN",
+    # Tiếp tục bổ sung nếu cần...
+}
+
+
+def bank_name(bank_bin):
+    return BANKS.get(bank_bin, f"Mã BIN {bank_bin}")
@@ -0,0 +1,135 @@
+import argparse, csv, io, json, os, re, sys, time, zipfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from vietqr.banks import BIDV_BIN
+from vietqr.output import FORMATS
+from vietqr.payload import build_vietqr_payload, clean_amount_input, sanitize_input
+from vietqr.pool import bounded_map
+from vietqr.render import TEMPLATES, render_template
+from vietqr.staff import lookup_staff
+
+# ======== Tạo ảnh QR hàng loạt ========
+# Đọc danh sách merchant (CSV hoặc JSONL, các cột account, name, store, note,
+# amount, staff, tuỳ chọn bank_bin), vẽ các mẫu đã chọn trên nhiều tiến trình
+# và ghi thẳng từng ảnh vào file ZIP, không giữ toàn bộ ảnh trong bộ nhớ.
+#
+#   python -m vietqr.batch merchants.csv -o qr.zip -t background,tingbox -j 4
+
+BatchReport = namedtuple("BatchReport", ["rows", "images", "bytes", "errors", "seconds"])
+
+
+def read_rows(path):
+    if path.lower().endswith((".jsonl", ".ndjson")):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            yield from csv.DictReader(f)
+
+
+def render_row(row, templates, fmt="png"):
+    account = sanitize_input(str(row.get("account") or ""))
+    if not account:
+        raise ValueError("Thiếu số tài khoản")
+    raw_amount = str(row.get("amount") or "").strip()
+    amount = clean_amount_input(raw_amount)
+    if amount is None:
+        raise ValueError(f"Số tiền không hợp lệ: {raw_amount}")
+    staff_name, staff_phone = lookup_staff(row.get("staff"))
+    bank_bin = sanitize_input(str(row.get("bank_bin") or BIDV_BIN))
+    name = str(row.get("name") or "").strip()
+    store = str(row.get("store") or "").strip()
+    note = str(row.get("note") or "").strip()
+
+    data = build_vietqr_payload(account, bank_bin, note, amount)
+    return [
+        (t, render_template(t, data, name, account, store, staff_name, staff_phone, fmt=fmt).getvalue())
+        for t in templates
+    ]
+
+
+def _render_task(task):
+    index, row, templates, fmt = task
+    account = str(row.get("account") or "")
+    try:
+        return index, account, render_row(row, templates, fmt), None
+    except Exception as e:
+        return index, account, None, str(e)
+
+
+def _file_name(index, account, template, fmt):
+    account = re.sub(r"[^0-9A-Za-z]", "", account) or "x"
+    return f"{index:05d}_{account}_{template}.{FORMATS[fmt]['ext']}"
+
+
+def run_batch(rows, out_path, templates=None, workers=None, progress=None, fmt="png"):
+    templates = list(templates or TEMPLATES)
+    if fmt not in FORMATS:
+        raise ValueError(f"Định dạng ảnh không hợp lệ: {fmt}. Các định dạng: {', '.join(FORMATS)}")
+    for t in templates:
+        if t not in TEMPLATES:
+            raise ValueError(f"Không có mẫu '{t}'. Các mẫu: {', '.join(TEMPLATES)}")
+    workers = workers or os.cpu_count() or 1
+    window = workers * 4  # số dòng đang xử lý tối đa, giới hạn bộ nhớ chờ ghi
+
+    done = images = nbytes = 0
+    errors = []
+    start = time.perf_counter()
+    tasks = ((i, row, templates, fmt) for i, row in enumerate(rows, 1))
+
+    # Ảnh đã nén sẵn nên lưu ZIP_STORED, khỏi tốn CPU nén lại
+    with zipfile.ZipFile(out_path, "w", zipfile.ZIP_STORED) as zf, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        for index, account, outputs, error in bounded_map(pool, _render_task, tasks, window):
+            done += 1
+            if error:
+                errors.append((index, account, error))
+            else:
+                for template, png in outputs:
+                    zf.writestr(_file_name(index, account, template, fmt), png)
+                    images += 1
+                    nbytes += len(png)
+            if progress:
+                progress(done, images, len(errors), time.perf_counter() - start)
+
+        if errors:
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerow(["row", "account", "error"])
+            writer.writerows(sorted(errors))
+            zf.writestr("errors.csv", buf.getvalue().encode("utf-8-sig"))
+
+    return BatchReport(done, images, nbytes, sorted(errors), time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tạo ảnh VietQR hàng loạt từ CSV/JSONL ra file ZIP")
+    parser.add_argument("input", help="file CSV hoặc JSONL (account, name, store, note, amount, staff)")
+    parser.add_argument("-o", "--output", default="vietqr_batch.zip", help="file ZIP kết quả")
+    parser.add_argument("-t", "--templates", default=",".join(TEMPLATES),
+                        help=f"các mẫu cần vẽ, cách nhau bởi dấu phẩy ({', '.join(TEMPLATES)})")
+    parser.add_argument("-f", "--format", default="png", choices=list(FORMATS),
+                        help="định dạng ảnh (print: PNG bảng màu, nhỏ hơn nhiều)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="số tiến trình (mặc định: số CPU)")
+    args = parser.parse_args(argv)
+
+    def progress(done, images, failed, elapsed):
+        rate = images / elapsed if elapsed else 0.0
+        print(f"\r{done} dòng, {images} ảnh, {failed} lỗi, {rate:.1f} ảnh/s", end="", file=sys.stderr)
+
+    templates = [t.strip() for t in args.templates.split(",") if t.strip()]
+    report = run_batch(read_rows(args.input), args.output, templates, args.workers, progress, args.format)
+    print(file=sys.stderr)
+    for index, account, error in report.errors:
+        print(f"❌ Dòng {index} ({account}): {error}", file=sys.stderr)
+    rate = report.images / report.seconds if report.seconds else 0.0
+    print(f"✅ {report.rows} dòng, {report.images} ảnh ({report.bytes / 1e6:.1f} MB), "
+          f"{len(report.errors)} lỗi, {report.seconds:.1f}s, {rate:.1f} ảnh/s -> {args.output}")
+    return 1 if report.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
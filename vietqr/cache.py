@@ -0,0 +1,222 @@
+import hashlib, io, json, os, threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future
+from vietqr import trace
+from vietqr.assets import asset_version
+from vietqr.output import format_scale
+from vietqr.qr import QR_MASK
+from vietqr.render import RENDER_VERSION, render_template
+
+# ======== Cache ảnh đã vẽ theo nội dung ========
+# Khoá là băm của (mẫu, payload, tên, tài khoản, cửa hàng, cán bộ, SĐT, định
+# dạng ảnh và tỉ lệ vẽ của nó, phiên bản assets, phiên bản code vẽ). PNG được
+# giữ trong LRU giới hạn dung lượng; nếu đặt VIETQR_RENDER_CACHE_DIR thì ghi thêm xuống đĩa để dùng lại
+# sau khi khởi động lại.
+#
+# Đây là kho ảnh duy nhất của tiến trình: phiên người dùng chỉ giữ RenderHandle
+# (mẫu + tham số, vài trăm byte), ảnh bị đẩy khỏi cache thì được vẽ lại khi
+# cần. Nhiều phiên cùng vẽ một ảnh giống hệt thì chỉ một thread vẽ, các thread
+# còn lại chờ và dùng chung kết quả.
+
+
+def render_key(template, data, acc_name="", merchant_id="", store_name="", support_name="", support_phone="",
+               fmt="png"):
+    fields = [template, data, acc_name, merchant_id, store_name, support_name, support_phone, fmt,
+              format_scale(fmt), asset_version(), RENDER_VERSION]
+    if QR_MASK is not None:
+        fields.append(QR_MASK)  # mask cố định cho ảnh khác với mask tự chọn (mặc định giữ nguyên khoá cũ)
+    return hashlib.sha256(json.dumps(fields, ensure_ascii=False).encode()).hexdigest()
+
+
+class RenderCache:
+    def __init__(self, max_bytes, disk_dir=None, disk_max_bytes=0):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._items = OrderedDict()  # key -> PNG bytes, thứ tự LRU
+        self._bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0  # số lần chờ dùng chung ảnh đang được thread khác vẽ
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+
+    # ----- Bộ nhớ -----
+    def get(self, key):
+        with self._lock:
+            png = self._items.get(key)
+            if png is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return png
+        png = self._disk_get(key)
+        with self._lock:
+            if png is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, png)
+        return png
+
+    def put(self, key, png):
+        with self._lock:
+            self._remember(key, png)
+        self._disk_put(key, png)
+
+    def _remember(self, key, png):
+        if len(png) > self.max_bytes:
+            return
+        old = self._items.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old)
+        self._items[key] = png
+        self._bytes += len(png)
+        while self._bytes > self.max_bytes:
+            _, dropped = self._items.popitem(last=False)
+            self._bytes -= len(dropped)
+            self.evictions += 1
+
+    # ----- Đĩa -----
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key + ".img")
+
+    def _disk_get(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                png = f.read()
+            os.utime(path)  # đánh dấu vừa dùng, để dọn theo LRU
+            return png
+        except OSError:
+            return None
+
+    def _disk_put(self, key, png):
+        if not self.disk_dir or len(png) > self.disk_max_bytes:
+            return
+        path = self._disk_path(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(png)
+            os.replace(tmp, path)  # ghi nguyên tử, tiến trình khác không đọc phải file dở
+        except OSError:
+            return
+        with self._lock:
+            self._disk_bytes += len(png)
+            over = self._disk_bytes > self.disk_max_bytes
+        if over:
+            self._disk_evict()
+
+    def _disk_entries(self):
+        for sub in os.scandir(self.disk_dir):
+            if sub.is_dir():
+                for entry in os.scandir(sub.path):
+                    if entry.name.endswith(".img"):
+                        info = entry.stat()
+                        yield entry.path, info.st_size, info.st_mtime
+
+    def _disk_evict(self):
+        # Dọn file ít dùng nhất tới 90% ngân sách để không phải quét thư mục mỗi lần ghi
+        entries = sorted(self._disk_entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.disk_max_bytes * 0.9
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_bytes = total
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.disk_hits + self.misses
+            return {
+                "items": len(self._items),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "disk_bytes": self._disk_bytes,
+                "disk_max_bytes": self.disk_max_bytes if self.disk_dir else 0,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "coalesced": self.coalesced,
+                "hit_rate": (self.hits + self.disk_hits) / total if total else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+
+render_cache = RenderCache(
+    int(os.environ.get("VIETQR_RENDER_CACHE_MB", 128)) * 1024 * 1024,
+    os.environ.get("VIETQR_RENDER_CACHE_DIR") or None,
+    int(os.environ.get("VIETQR_RENDER_CACHE_DISK_MB", 1024)) * 1024 * 1024,
+)
+
+
+_inflight = {}  # khoá -> Future của ảnh đang vẽ
+_inflight_lock = threading.Lock()
+
+
+def _render_once(key, template, data, args, fmt):
+    with _inflight_lock:
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = _inflight[key] = Future()
+    if not owner:
+        with render_cache._lock:
+            render_cache.coalesced += 1
+        return future.result()
+    try:
+        png = render_template(template, data, *args, fmt=fmt).getvalue()
+        render_cache.put(key, png)
+        future.set_result(png)
+        return png
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+        if not future.done():
+            future.cancel()  # bị ngắt giữa chừng: thread đang chờ không bị treo
+
+
+def render_cached(template, data, *args, fmt="png"):
+    key = render_key(template, data, *args, fmt=fmt)
+    with trace.template(template), trace.span("render_cache"):
+        png = render_cache.get(key)
+    if png is None:
+        png = _render_once(key, template, data, args, fmt)
+    return io.BytesIO(png)
+
+
+# ----- Tham chiếu ảnh giữ trong phiên -----
+RenderHandle = namedtuple("RenderHandle", ["template", "args", "fmt"])
+
+
+def render_handle(template, data, *args, fmt="png"):
+    return RenderHandle(template, (data,) + tuple(args), fmt)
+
+
+def load_handle(handle):
+    # Lấy ảnh từ cache dùng chung, bị đẩy ra rồi thì vẽ lại
+    return render_cached(handle.template, *handle.args, fmt=handle.fmt)
@@ -0,0 +1,17 @@
+import binascii
+
+# ======== CRC16-CCITT (poly 0x1021, init 0xFFFF) cho tag 63 ========
+# Tính bằng binascii.crc_hqx (viết bằng C) thay cho vòng lặp 8 bit mỗi byte,
+# kết quả giống hệt bản cũ.
+
+CRC_INIT = 0xFFFF
+
+
+def crc16_update(crc, data):
+    # Trạng thái CRC sau khi thêm data (bytes); dùng để nối tiếp từ một tiền tố đã tính
+    return binascii.crc_hqx(data, crc)
+
+
+def crc16_ccitt(data):
+    return f"{crc16_update(CRC_INIT, data.encode()):04X}"
+
@@ -0,0 +1,227 @@
+import io, os, threading, time
+from collections import namedtuple
+from functools import lru_cache
+
+from PIL import Image
+
+from vietqr import trace
+from vietqr.tlv import parse_vietqr
+
+# ======== Đọc mã QR từ ảnh, hoàn toàn cục bộ ========
+# File ảnh được giải mã một lần, thẳng từ buffer (không chép), thành ảnh xám;
+# ảnh chụp lớn được giải mã ở độ phân giải giảm 2/4/8 lần (IMREAD_REDUCED_*,
+# với JPEG là giảm ngay trong bộ giải nén) để cạnh dài không quá
+# VIETQR_DECODE_MAX_SIDE. Mọi bước dưới đây dùng chung khung ảnh đó; chỉ khi
+# không đọc được mới giải mã lại ở độ phân giải gốc và thử lại.
+#
+# Thử lần lượt từ rẻ đến đắt, dừng ở kết quả đầu tiên là payload VietQR hợp
+# lệ (bắt đầu bằng "00" và tách được TLV):
+#   1. OpenCV, rồi pyzbar (nếu có thư viện zbar) trên ảnh xám
+#   2. Các bản tiền xử lý - ngưỡng thích nghi, đổi tỉ lệ, xoay - mỗi bản
+#      thử lại bằng OpenCV rồi pyzbar
+# Mỗi ảnh có ngân sách thời gian (VIETQR_DECODE_BUDGET_MS, mặc định 2000 ms);
+# hết giờ thì dừng với kết quả đang có. Số lần đọc được theo từng bước được
+# cộng dồn (decode_stats); bước ở lượt độ phân giải gốc có thêm hậu tố "/full".
+
+DECODE_BUDGET = int(os.environ.get("VIETQR_DECODE_BUDGET_MS", 2000)) / 1000
+DECODE_MAX_SIDE = int(os.environ.get("VIETQR_DECODE_MAX_SIDE", 1600))
+
+# OpenCV và NumPy nặng (~250 ms nạp), chỉ nạp ở lần đọc ảnh đầu tiên (_load_cv)
+cv2 = np = None
+
+_REDUCED = (2, 4, 8)  # cv2.IMREAD_REDUCED_GRAYSCALE_2/4/8
+
+# data: payload hợp lệ hoặc None; stage: "<bộ giải mã>/<tiền xử lý>" đã đọc được;
+# rejected: chữ đọc được nhưng không phải VietQR (để báo lỗi rõ hơn)
+DecodeResult = namedtuple("DecodeResult", ["data", "stage", "seconds", "rejected"])
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def is_vietqr(text):
+    if not text or not text.startswith("00"):
+        return False
+    try:
+        parse_vietqr(text)  # được cache, bước tách thông tin sau đó không phải duyệt lại
+    except ValueError:
+        return False
+    return True
+
+
+def _load_cv():
+    global cv2, np
+    if cv2 is None:
+        import cv2 as _cv2, numpy as _np
+        cv2, np = _cv2, _np
+
+
+def _opencv(img):
+    data, _, _ = cv2.QRCodeDetector().detectAndDecode(img)
+    return [data] if data else []
+
+
+@lru_cache(maxsize=None)
+def _zbar():
+    # pyzbar cần thư viện hệ thống libzbar; thiếu thì bỏ qua bước này
+    try:
+        from pyzbar import pyzbar
+    except (ImportError, OSError):
+        return None
+    return pyzbar
+
+
+def _pyzbar(img):
+    pyzbar = _zbar()
+    if pyzbar is None:
+        return []
+    symbols = pyzbar.decode(img, symbols=[pyzbar.ZBarSymbol.QRCODE])
+    return [s.data.decode("utf-8", "replace") for s in symbols]
+
+
+def _gray(img):
+    return img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+
+def _image_side(buf):
+    # Chỉ đọc phần đầu file để lấy kích thước, chưa giải mã điểm ảnh
+    try:
+        with Image.open(io.BytesIO(buf[:256 * 1024])) as im:
+            return max(im.size)
+    except Exception:
+        return 0
+
+
+def _reduction(side):
+    for factor in _REDUCED:
+        if side / factor <= DECODE_MAX_SIDE:
+            return factor
+    return max(_REDUCED)
+
+
+def _scales(gray):
+    # Ảnh chụp lớn thu nhỏ về ~1000 px, ảnh nhỏ/mờ phóng to gấp đôi
+    side = max(gray.shape[:2])
+    if side > 1600:
+        yield "scale", cv2.resize(gray, None, fx=1000 / side, fy=1000 / side, interpolation=cv2.INTER_AREA)
+    if side < 800:
+        yield "scale", cv2.resize(gray, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC)
+
+
+def _rotations(gray):
+    h, w = gray.shape[:2]
+    for angle in (45, -45):
+        m = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+        cos, sin = abs(m[0, 0]), abs(m[0, 1])
+        size = (int(h * sin + w * cos), int(h * cos + w * sin))
+        m[0, 2] += size[0] / 2 - w / 2
+        m[1, 2] += size[1] / 2 - h / 2
+        yield "rotate", cv2.warpAffine(gray, m, size, borderValue=255)
+    yield "rotate", cv2.rotate(gray, cv2.ROTATE_90_CLOCKWISE)
+
+
+def _attempts(img):
+    # Sinh (bước, bộ giải mã, ảnh) theo thứ tự; ảnh tiền xử lý chỉ được tạo khi cần
+    gray = _gray(img)
+    yield "original", _opencv, gray
+    yield "original", _pyzbar, gray
+    binary = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 10)
+    yield "threshold", _opencv, binary
+    yield "threshold", _pyzbar, binary
+    for variant in (_scales, _rotations):
+        for name, image in variant(gray):
+            yield name, _opencv, image
+            yield name, _pyzbar, image
+
+
+def _record(stage, seconds):
+    with _stats_lock:
+        entry = _stats.setdefault(stage, {"count": 0, "seconds": 0.0})
+        entry["count"] += 1
+        entry["seconds"] += seconds
+
+
+def _cascade(img, start, budget, suffix=""):
+    # Trả về (payload, bước, chữ không hợp lệ đầu tiên)
+    rejected = None
+    if img is None or not img.size:
+        return None, None, None
+    for step, decoder, image in _attempts(img):
+        with trace.span(f"decode.{decoder.__name__[1:]}/{step}{suffix}"):
+            texts = decoder(image)
+        for text in texts:
+            text = text.strip()
+            if is_vietqr(text):
+                return text, f"{decoder.__name__[1:]}/{step}{suffix}", rejected
+            rejected = rejected or text
+        if time.perf_counter() - start > budget:
+            break
+    return None, None, rejected
+
+
+def _result(start, data, stage, rejected):
+    elapsed = time.perf_counter() - start
+    _record(stage or "failed", elapsed)
+    return DecodeResult(data, stage, elapsed, rejected)
+
+
+def _load(buf):
+    # Giải mã file một lần thành ảnh xám, giảm độ phân giải nếu ảnh lớn; trả về (ảnh, hệ số giảm)
+    side = _image_side(buf)
+    factor = _reduction(side) if side > DECODE_MAX_SIDE else 1
+    flag = getattr(cv2, f"IMREAD_REDUCED_GRAYSCALE_{factor}") if factor > 1 else cv2.IMREAD_GRAYSCALE
+    return cv2.imdecode(buf, flag), factor
+
+
+def decode_qr(image_bytes, budget=None):
+    # image_bytes: bytes, memoryview (vd. UploadedFile.getbuffer()) ... - không bị chép
+    _load_cv()
+    budget = DECODE_BUDGET if budget is None else budget
+    start = time.perf_counter()
+    buf = np.frombuffer(image_bytes, np.uint8)
+    with trace.span("decode.load"):
+        img, factor = _load(buf)
+    return _decode_frame(buf, img, factor, start, budget)
+
+
+def _decode_frame(buf, img, factor, start, budget):
+    # Lượt giảm độ phân giải chỉ dùng nửa ngân sách, để dành thời gian cho lượt gốc
+    data, stage, rejected = _cascade(img, start, budget / 2 if factor > 1 else budget)
+    if data is None and factor > 1 and time.perf_counter() - start <= budget:
+        del img  # giải phóng khung giảm trước khi giải mã bản đủ độ phân giải
+        with trace.span("decode.load/full"):
+            img = cv2.imdecode(buf, cv2.IMREAD_GRAYSCALE)
+        data, stage, full_rejected = _cascade(img, start, budget, "/full")
+        rejected = rejected or full_rejected
+    return _result(start, data, stage, rejected)
+
+
+def decode_qr_multi(image_bytes, budget=None):
+    # Ảnh chụp có thể chứa nhiều mã (vd. cả tờ dán của nhiều quầy): đọc tất cả
+    # bằng detectAndDecodeMulti trên cùng khung ảnh; không thấy mã nào hợp lệ
+    # thì quay về chuỗi thử của decode_qr. Trả về danh sách DecodeResult.
+    _load_cv()
+    budget = DECODE_BUDGET if budget is None else budget
+    start = time.perf_counter()
+    buf = np.frombuffer(image_bytes, np.uint8)
+    with trace.span("decode.load"):
+        img, factor = _load(buf)
+    if img is not None and img.size:
+        with trace.span("decode.opencv/multi"):
+            ok, texts, _, _ = cv2.QRCodeDetector().detectAndDecodeMulti(img)
+        found = []
+        for text in (texts if ok else ()):
+            text = text.strip()
+            if is_vietqr(text) and text not in found:
+                found.append(text)
+        if found:
+            return [_result(start, text, "opencv/multi", None) for text in found]
+    return [_decode_frame(buf, img, factor, start, budget)]
+
+
+def decode_stats():
+    with _stats_lock:
+        return {
+            stage: dict(e, avg_ms=e["seconds"] / e["count"] * 1000)
+            for stage, e in _stats.items()
+        }
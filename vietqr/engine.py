@@ -0,0 +1,339 @@
+from PIL import ImageDraw
+from vietqr import trace
+from vietqr.assets import asset_cache, LOGO_PATH
+from vietqr.output import encode_image
+from vietqr.qr import encode_matrix, rasterize
+from vietqr.text import fit_font_size, text_width
+
+# ======== Bộ vẽ mẫu theo khai báo ========
+# Mỗi mẫu là một dict mô tả: ảnh nền, khung QR, logo, các ô chữ, font, màu,
+# góc xoay. compile_template() làm trước mọi thứ tĩnh (giải mã nền, thêm
+# viền, nạp font, đo chữ cố định); CompiledTemplate.render() chỉ còn chép lớp
+# nền đã vẽ sẵn chú thích/cán bộ hỗ trợ rồi vẽ QR, nhãn và chữ của từng merchant.
+#
+# Các loại ô chữ ("type"):
+#   fields  - cặp nhãn + giá trị tự co chữ, xếp dọc ngay dưới mỗi QR
+#   caption - dòng chữ cố định phía trên mỗi QR
+#   text    - một trường ở vị trí cố định, hoặc căn giữa nền với "align": "canvas"
+#   support - dòng "Cán bộ hỗ trợ: <tên> - Liên hệ: <SĐT>"
+# "when": danh sách trường phải có giá trị mới vẽ ("support" = có tên hoặc SĐT cán bộ).
+# Toạ độ y âm được tính từ đáy nền.
+#
+# Với scale < 1 (ảnh xem trước), nền được thu nhỏ và mọi kích thước trong
+# mô tả (khung QR, toạ độ, cỡ chữ, khoảng cách) nhân theo cùng tỉ lệ.
+
+FIELDS = ("acc_name", "merchant_id", "store_name", "support_name", "support_phone")
+STAFF_FIELDS = ("support_name", "support_phone")  # chỉ phụ thuộc cán bộ hỗ trợ, vẽ sẵn vào lớp nền
+
+
+def _filled(value):
+    return bool(value and value.strip())
+
+
+def _label_width(font, text):
+    return text_width(font[0], font[1], text)
+
+
+def _scale_spec(spec, scale):
+    px = lambda v: int(round(v * scale))
+    pt = lambda p: (px(p[0]), px(p[1]))
+    font = lambda f: (f[0], max(1, px(f[1])))
+
+    qr = dict(spec["qr"])
+    for key in ("size", "logo"):
+        if key in qr:
+            qr[key] = pt(qr[key])
+    if "at" in qr:
+        qr["at"] = [pt(p) for p in qr["at"]]
+    if "radius" in qr:
+        qr["radius"] = px(qr["radius"])
+    if "center" in qr:
+        qr["center"] = {k: px(v) for k, v in qr["center"].items()}
+
+    slots = []
+    for slot in spec["slots"]:
+        slot = dict(slot)
+        for key in ("offset", "top", "label_advance", "y"):
+            if key in slot:
+                slot[key] = px(slot[key])
+        for key in ("font", "label_font"):
+            if slot.get(key):
+                slot[key] = font(slot[key])
+        if "at" in slot:
+            slot["at"] = pt(slot["at"])
+        if "fields" in slot:
+            slot["fields"] = [
+                dict(f, size=max(1, px(f["size"])), min_size=max(1, px(f["min_size"])),
+                     step=max(1, px(f["step"])), advance=px(f["advance"]))
+                for f in slot["fields"]
+            ]
+        slots.append(slot)
+    return dict(spec, pad=px(spec.get("pad", 0)), qr=qr, slots=slots)
+
+
+class CompiledTemplate:
+    def __init__(self, spec, scale=1.0):
+        self.scale = scale
+        if scale != 1.0:
+            spec = _scale_spec(spec, scale)
+        self.spec = spec
+        self.rotate = spec.get("rotate", 0)
+        self.pad = spec.get("pad", 0)
+
+        # ----- Nền (kèm viền trắng nếu có): không giữ ảnh ở đây, lấy từ asset_cache mỗi lần cần -----
+        self.width, self.height = self._base().size
+
+        # ----- Khung QR -----
+        qr = spec["qr"]
+        self.border = qr.get("border", 0)
+        self.radius = qr.get("radius", 0)
+        if "columns" in qr:
+            # Chia nền (trừ viền) thành các cột bằng nhau, mỗi cột một QR vuông
+            self.column_w = (self.width - 2 * self.pad) // qr["columns"]
+            side = int(self.column_w * qr["width_ratio"])
+            self.qr_size = (side, side)
+            self.columns = qr["columns"]
+            self.center = qr["center"]
+        else:
+            self.qr_size = tuple(qr["size"])
+            self.columns = 0
+        if "logo" in qr:
+            self.logo_size = tuple(qr["logo"])
+        else:
+            logo_src = asset_cache.image(LOGO_PATH)
+            logo_w = int(self.qr_size[0] * qr["logo_width_ratio"])
+            self.logo_size = (logo_w, int(logo_src.height / logo_src.width * logo_w))
+        self.at = [tuple(p) for p in qr.get("at", [])]
+
+        # ----- Ô chữ: nạp font, đo trước các chữ cố định -----
+        self.slots = [self._compile_slot(slot) for slot in spec["slots"]]
+
+    def _compile_slot(self, slot):
+        slot = dict(slot)
+        kind = slot["type"]
+        if kind == "fields":
+            max_width = slot["max_width"]
+            slot["max_width_px"] = self.qr_size[0] if max_width == "qr" else int(self.width * max_width)
+            if slot.get("label_font"):
+                asset_cache.font(*slot["label_font"])
+                slot["fields"] = [
+                    dict(f, label_w=_label_width(slot["label_font"], f["label"])) for f in slot["fields"]
+                ]
+        elif kind == "caption":
+            asset_cache.font(*slot["font"])
+            slot["text_w"] = _label_width(slot["font"], slot["text"])
+        elif kind == "text":
+            asset_cache.font(*slot["font"])
+            if "at" in slot:
+                slot["at"] = self._point(slot["at"])
+        elif kind == "support":
+            asset_cache.font(*slot["font"])
+            slot["at"] = self._point(slot["at"])
+            slot["prefix_w"] = _label_width(slot["font"], slot["prefix"])
+            slot["separator_w"] = _label_width(slot["font"], slot["separator"])
+        else:
+            raise ValueError(f"Loại ô chữ không hợp lệ: {kind}")
+        return slot
+
+    def _base(self):
+        path = self.spec["background"]
+        if self.pad:
+            return asset_cache.padded(path, self.scale, self.pad)
+        return asset_cache.image(path) if self.scale == 1.0 else asset_cache.scaled(path, self.scale)
+
+    def _point(self, at):
+        x, y = at
+        return x, (self.height + y if y < 0 else y)
+
+    # ----- Vẽ -----
+    def _qr(self, data):
+        with trace.span("qr_encode"):
+            matrix = encode_matrix(data)
+        with trace.span("qr_compose"):
+            # Vẽ thẳng ra đúng khung QR, bo góc và logo trong cùng một lượt (xem vietqr.qr)
+            return rasterize(matrix, self.qr_size, self.border, self.radius, asset_cache.logo(LOGO_PATH, self.logo_size))
+
+    def _fit(self, values):
+        # Cỡ chữ cho từng trường giá trị, tính một lần dùng cho mọi QR
+        sizes = {}
+        for slot in self.slots:
+            if slot["type"] != "fields":
+                continue
+            for f in slot["fields"]:
+                value = values[f["field"]]
+                if _filled(value):
+                    text = value.upper() if f.get("upper") else value
+                    sizes[f["field"]] = (text, fit_font_size(
+                        slot["value_font"], text, slot["max_width_px"], f["size"], f["min_size"], f["step"]))
+        return sizes
+
+    def _positions(self, sizes):
+        if not self.columns:
+            return self.at
+        # Căn giữa theo chiều dọc cả khối: khoảng trên + QR + các dòng chữ
+        qr_w, qr_h = self.qr_size
+        top, gap = self.center["top"], self.center["gap"]
+        text_h = 0
+        for slot in self.slots:
+            if slot["type"] == "fields":
+                for f in slot["fields"]:
+                    if f["field"] in sizes:
+                        text_h += slot["label_font"][1] + gap + sizes[f["field"]][1]
+        qr_y = (self.height - (qr_h + text_h + top)) // 2 + top
+        return [(self.pad + i * self.column_w + (self.column_w - qr_w) // 2, qr_y) for i in range(self.columns)]
+
+    def _when(self, slot, values):
+        for cond in slot.get("when", ()):
+            if cond == "support":
+                if not (_filled(values["support_name"]) or _filled(values["support_phone"])):
+                    return False
+            elif not _filled(values[cond]):
+                return False
+        return True
+
+    # Mỗi lệnh vẽ là (toạ độ, chữ, màu, (font, cỡ)). Chỉ lệnh không phụ thuộc
+    # merchant mới là "tĩnh" và được vẽ sẵn vào lớp nền: dòng chú thích ở khung QR
+    # cố định, thông tin cán bộ hỗ trợ. Nhãn của các trường xếp dọc theo cỡ chữ đã
+    # co của từng merchant (và khung QR căn giữa theo khối chữ đó) nên vẽ mỗi lần.
+    def _plan_fields(self, slot, sizes, qr_x, qr_y, ops):
+        qr_w, qr_h = self.qr_size
+        y = qr_y + qr_h + slot["top"]
+        if slot["align"] == "qr":
+            x_of = lambda w: qr_x + (qr_w - w) // 2
+        else:
+            x_of = lambda w: (self.width - w) // 2
+        for f in slot["fields"]:
+            if f["field"] not in sizes:
+                continue
+            text, size = sizes[f["field"]]
+            if f.get("label"):
+                ops.append(((x_of(f["label_w"]), y), f["label"], slot["label_fill"], slot["label_font"]))
+                y += slot["label_advance"]
+            font = (slot["value_font"], size)
+            ops.append(((x_of(text_width(font[0], size, text)), y), text, slot["fill"], font))
+            y += size + f["advance"]
+
+    def _plan_text(self, slot, values, ops):
+        value = values[slot["field"]]
+        if not _filled(value):
+            return
+        text = value.upper() if slot.get("upper") else value
+        if slot.get("align") == "canvas":
+            pos = ((self.width - text_width(slot["font"][0], slot["font"][1], text)) // 2, slot["y"])
+        else:
+            pos = slot["at"]
+        ops.append((pos, text, slot["fill"], slot["font"]))
+
+    def _plan_support(self, slot, values, ops):
+        name = values["support_name"] or ""
+        phone = values["support_phone"] or ""
+        path, size = slot["font"]
+        x, y = slot["at"]
+        ops.append(((x, y), slot["prefix"], slot["label_fill"], slot["font"]))
+        x += slot["prefix_w"]
+        ops.append(((x, y), name, slot["fill"], slot["font"]))
+        x += text_width(path, size, name)
+        ops.append(((x, y), slot["separator"], slot["label_fill"], slot["font"]))
+        x += slot["separator_w"]
+        ops.append(((x, y), phone, slot["fill"], slot["font"]))
+
+    def _plan(self, values, sizes, positions):
+        static, dynamic = [], []
+        captions = dynamic if self.columns else static  # khung QR chia cột dịch theo khối chữ
+        for qr_x, qr_y in positions:
+            for slot in self.slots:
+                if slot["type"] == "caption":
+                    x = qr_x + (self.qr_size[0] - slot["text_w"]) // 2
+                    captions.append(((x, qr_y + slot["offset"]), slot["text"], slot["fill"], slot["font"]))
+                elif slot["type"] == "fields":
+                    self._plan_fields(slot, sizes, qr_x, qr_y, dynamic)
+        for slot in self.slots:
+            if not self._when(slot, values):
+                continue
+            if slot["type"] == "text":
+                self._plan_text(slot, values, static if slot["field"] in STAFF_FIELDS else dynamic)
+            elif slot["type"] == "support":
+                self._plan_support(slot, values, static)
+        return tuple(static), dynamic
+
+    def _layer(self, static):
+        # Nền đã vẽ sẵn phần tĩnh, cache theo chính danh sách lệnh vẽ: mỗi cán bộ
+        # hỗ trợ có một lớp riêng, dùng chung cho mọi merchant
+        def build():
+            layer = self._base().copy()
+            _draw_ops(ImageDraw.Draw(layer), static)
+            return layer
+        return asset_cache.layer((self.spec["background"], self.scale, self.pad, static), build)
+
+    def render(self, data, acc_name="", merchant_id="", store_name="", support_name="", support_phone="", fmt="png"):
+        values = dict(zip(FIELDS, (acc_name, merchant_id, store_name, support_name, support_phone)))
+        qr_img = self._qr(data)
+        with trace.span("fit_text"):
+            sizes = self._fit(values)
+            positions = self._positions(sizes)
+            static, dynamic = self._plan(values, sizes, positions)
+
+        with trace.span("background"):
+            base = self._layer(static).copy()
+        with trace.span("paste"):
+            for qr_x, qr_y in positions:
+                base.paste(qr_img, (qr_x, qr_y), qr_img)
+        with trace.span("draw_text"):
+            _draw_ops(ImageDraw.Draw(base), dynamic)
+        return self._finish(base, fmt)
+
+    def rotated(self, img):
+        if not self.rotate:
+            return img
+        with trace.span("rotate"):
+            return img.rotate(self.rotate, expand=True)
+
+    def _finish(self, base, fmt):
+        return encode_image(self.rotated(base), fmt)
+
+    # ----- Vẽ nhiều QR cho cùng một merchant (xem vietqr.plan) -----
+    def positions(self, acc_name="", merchant_id="", store_name="", support_name="", support_phone=""):
+        values = dict(zip(FIELDS, (acc_name, merchant_id, store_name, support_name, support_phone)))
+        return tuple(self._positions(self._fit(values)))
+
+    def canvas(self, acc_name="", merchant_id="", store_name="", support_name="", support_phone=""):
+        # Nền đã vẽ mọi chữ của merchant, khung QR để trống; chữ không chồng lên
+        # khung QR nên vẽ trước hay sau khi dán QR đều cho cùng một ảnh như render()
+        values = dict(zip(FIELDS, (acc_name, merchant_id, store_name, support_name, support_phone)))
+        sizes = self._fit(values)
+        static, dynamic = self._plan(values, sizes, self._positions(sizes))
+        canvas = self._layer(static).copy()
+        _draw_ops(ImageDraw.Draw(canvas), dynamic)
+        return canvas
+
+    def render_on(self, canvas, positions, data, fmt="png"):
+        qr_img = self._qr(data)
+        with trace.span("background"):
+            base = canvas.copy()
+        with trace.span("paste"):
+            for qr_x, qr_y in positions:
+                base.paste(qr_img, (qr_x, qr_y), qr_img)
+        return self._finish(base, fmt)
+
+    def tile(self, data, fmt="png"):
+        # Chỉ ảnh QR (đã xoay như ảnh cuối), để dán lên nền ở các ô boxes()
+        return self._finish(self._qr(data), fmt)
+
+    def boxes(self, positions):
+        # (x, y, rộng, cao) của các khung QR trong ảnh cuối, tính cả góc xoay
+        width, height = self.width, self.height
+        out = []
+        for x, y in positions:
+            box, w, h = (x, y) + self.qr_size, width, height
+            for _ in range(self.rotate // 90 % 4):  # mỗi lần xoay 90° ngược chiều kim đồng hồ
+                box, w, h = (box[1], w - box[0] - box[2], box[3], box[2]), h, w
+            out.append(box)
+        return out
+
+def _draw_ops(draw, ops):
+    for pos, text, fill, font in ops:
+        draw.text(pos, text, fill=fill, font=asset_cache.font(*font))
+
+
+def compile_template(spec, scale=1.0):
+    return CompiledTemplate(spec, scale)
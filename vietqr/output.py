@@ -0,0 +1,93 @@
+import io, os, threading, time
+from PIL import Image, features
+from vietqr import trace
+
+# ======== Định dạng ảnh đầu ra ========
+# Nén PNG ảnh nền khổ in chiếm phần lớn thời gian vẽ, nên mỗi mục đích dùng
+# một định dạng riêng:
+#   png     - PNG mặc định của Pillow, như trước (API, tạo hàng loạt)
+#   preview - vẽ ở độ phân giải thu nhỏ (VIETQR_PREVIEW_SCALE, mặc định 0.5)
+#             và nén PNG nhẹ, để hiển thị trên màn hình
+#   print   - PNG bảng màu 256 màu, nhỏ hơn 5-7 lần, để tải về/in
+#   webp, jpeg - tuỳ chọn, khi cần ảnh nhẹ hơn nữa
+# Thời gian nén và dung lượng được cộng dồn theo định dạng (encode_stats).
+
+# Trình duyệt chỉ hiện ảnh rộng vài trăm pixel, nền khổ in thì rộng 1400-2000
+PREVIEW_SCALE = float(os.environ.get("VIETQR_PREVIEW_SCALE", 0.5))
+
+FORMATS = {
+    "png": {"ext": "png", "mime": "image/png"},
+    "preview": {"ext": "png", "mime": "image/png", "scale": PREVIEW_SCALE},
+    "print": {"ext": "png", "mime": "image/png"},
+    "webp": {"ext": "webp", "mime": "image/webp"},
+    "jpeg": {"ext": "jpg", "mime": "image/jpeg"},
+}
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def available_formats():
+    return [f for f in FORMATS if f != "webp" or features.check("webp")]
+
+
+def format_scale(fmt):
+    # Tỉ lệ độ phân giải so với nền gốc mà định dạng này được vẽ ở đó
+    return FORMATS[fmt].get("scale", 1.0) if fmt in FORMATS else 1.0
+
+
+def _palette(img):
+    # Lượng tử hoá 254 màu, thêm 2 ô đen/trắng tuyệt đối để các module QR giữ nguyên
+    import numpy as np
+    img = img.convert("RGBA")
+    pal = img.quantize(254, method=Image.Quantize.FASTOCTREE)
+    entries = pal.getpalette("RGBA")
+    n = len(entries) // 4
+    index = np.array(pal)
+    pixels = np.asarray(img).view(np.uint32)[..., 0]
+    index[pixels == np.frombuffer(bytes((0, 0, 0, 255)), np.uint32)[0]] = n
+    index[pixels == np.frombuffer(bytes((255, 255, 255, 255)), np.uint32)[0]] = n + 1
+    out = Image.fromarray(index, "P")
+    out.putpalette(entries + [0, 0, 0, 255, 255, 255, 255, 255], "RGBA")
+    return out
+
+
+def _flatten(img):
+    if img.mode != "RGBA":
+        return img.convert("RGB")
+    white = Image.new("RGBA", img.size, (255, 255, 255, 255))
+    return Image.alpha_composite(white, img).convert("RGB")
+
+
+def encode_image(img, fmt="png"):
+    if fmt not in FORMATS:
+        raise ValueError(f"Định dạng ảnh không hợp lệ: {fmt}. Các định dạng: {', '.join(FORMATS)}")
+    start = time.perf_counter()
+    buf = io.BytesIO()
+    with trace.span("encode"):
+        if fmt == "png":
+            img.save(buf, format="PNG")
+        elif fmt == "preview":
+            img.save(buf, format="PNG", compress_level=1)
+        elif fmt == "print":
+            _palette(img).save(buf, format="PNG", optimize=True)
+        elif fmt == "webp":
+            img.save(buf, format="WEBP", quality=90, method=4)
+        elif fmt == "jpeg":
+            _flatten(img).save(buf, format="JPEG", quality=90, optimize=True)
+    elapsed = time.perf_counter() - start
+    with _stats_lock:
+        entry = _stats.setdefault(fmt, {"count": 0, "seconds": 0.0, "bytes": 0})
+        entry["count"] += 1
+        entry["seconds"] += elapsed
+        entry["bytes"] += buf.tell()
+    buf.seek(0)
+    return buf
+
+
+def encode_stats():
+    with _stats_lock:
+        return {
+            fmt: dict(e, avg_ms=e["seconds"] / e["count"] * 1000, avg_bytes=e["bytes"] // e["count"])
+            for fmt, e in _stats.items()
+        }
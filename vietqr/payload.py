@@ -0,0 +1,52 @@
+import math
+from vietqr.crc import crc16_ccitt
+from vietqr.tlv import TLV, parse_vietqr
+
+# ======== Tạo payload VietQR (EMVCo TLV) ========
+def clean_amount_input(raw_input):
+    if not raw_input:
+        return ""
+    try:
+        # Xử lý định dạng: "1.000.000,50" => "1000000.50"
+        cleaned = raw_input.replace(".", "").replace(",", ".")
+        value = float(cleaned)
+        if not math.isfinite(value) or value < 0:  # "inf", "nan", số âm
+            return None
+        return str(int(value))  # Lấy phần nguyên
+    except ValueError:
+        return None
+        
+def format_tlv(tag, value):
+    # Độ dài chỉ có 2 chữ số: value dài hơn 99 ký tự thì QR sai chuẩn, app ngân hàng không đọc được
+    if len(value) > 99:
+        raise ValueError(f"Giá trị tag {tag} dài {len(value)} ký tự, tối đa 99")
+    return f"{tag}{len(value):02d}{value}"
+def sanitize_input(text):
+    return ''.join(text.split())
+
+# Phần đầu chỉ phụ thuộc tài khoản; phần đuôi (số tiền, nội dung, "6304") đổi
+# theo từng giao dịch - vietqr.plan giữ sẵn CRC của phần đầu và chỉ tính tiếp phần đuôi
+def payload_prefix(merchant_id, bank_bin):
+    p = format_tlv
+    payload = p("00", "01") + p("01", "12")
+    acc_info = p("00", bank_bin) + p("01", merchant_id)
+    nested_38 = p("00", "A000000727") + p("01", acc_info) + p("02", "QRIBFTTA")
+    return payload + p("38", nested_38) + p("52", "0000") + p("53", "704")
+
+def payload_suffix(add_info, amount=""):
+    p = format_tlv
+    return (p("54", amount) if amount else "") + p("58", "VN") + p("62", p("08", add_info)) + "6304"
+
+def build_vietqr_payload(merchant_id, bank_bin, add_info, amount=""):
+    payload = payload_prefix(merchant_id, bank_bin) + payload_suffix(add_info, amount)
+    return payload + crc16_ccitt(payload)
+
+
+# ======== Đọc payload VietQR (xem vietqr.tlv) ========
+def parse_tlv(payload):
+    return TLV(payload).to_dict()
+
+
+def extract_vietqr_info(payload):
+    qr = parse_vietqr(payload)
+    return {"account": qr.account, "bank_bin": qr.bank_bin, "name": qr.name, "note": qr.note, "amount": qr.amount}
@@ -0,0 +1,86 @@
+import os
+from functools import lru_cache
+
+from vietqr.assets import asset_cache
+from vietqr.banks import BIDV_BIN
+from vietqr.crc import CRC_INIT, crc16_update
+from vietqr.output import encode_image, format_scale
+from vietqr.payload import payload_prefix, payload_suffix
+from vietqr.render import TEMPLATES, compiled_template, generate_qr_with_logo
+
+# ======== Vẽ QR số tiền động cho một merchant (máy POS, Tingbox) ========
+# Mỗi giao dịch của cùng một merchant chỉ khác số tiền/nội dung. MerchantPlan
+# làm trước mọi thứ còn lại:
+#   - phần đầu payload (tài khoản, BIN) và trạng thái CRC sau phần đầu đó
+#   - nền đã vẽ sẵn toàn bộ chữ (tên, tài khoản, cửa hàng, cán bộ hỗ trợ), khung
+#     QR để trống; nằm trong asset_cache nên tính vào ngân sách bộ nhớ chung
+# Mỗi giao dịch chỉ còn ghép phần đuôi (54 số tiền, 58, 62 nội dung, 6304),
+# tính nốt CRC và mã hoá QR. Có hai cách lấy ảnh:
+#   - render(): dán QR vào bản sao của nền rồi nén cả ảnh, giống hệt
+#     build_vietqr_payload + render_template; nén ảnh khổ in vẫn là phần tốn nhất
+#   - tile(): chỉ nén ảnh QR. Máy POS tải background() một lần (ảnh cuối với
+#     khung QR trống) và dán ảnh QR vào các ô boxes; ghép lại giống hệt render()
+#
+#   plan = merchant_plan("tingbox", "1234567890", acc_name="NGUYEN VAN A")
+#   png = plan.render("150000", "TT don 123").getvalue()
+#   qr = plan.tile("150000", "TT don 123").getvalue()   # dán vào plan.boxes
+
+PLAN_CACHE = int(os.environ.get("VIETQR_PLAN_CACHE", 256))  # plan chỉ giữ payload/toạ độ, nền ở asset_cache
+
+
+class MerchantPlan:
+    def __init__(self, template, account, bank_bin=BIDV_BIN, acc_name="", store_name="", support_name="",
+                 support_phone="", fmt="png"):
+        if template not in TEMPLATES:
+            raise ValueError(f"Mẫu không hợp lệ: {template}")
+        self.template = template
+        self.fmt = fmt
+        self.prefix = payload_prefix(account, bank_bin)
+        self._crc = crc16_update(CRC_INIT, self.prefix.encode())
+        self._names = (acc_name, account, store_name, support_name, support_phone)
+        self._positions = None
+        # mẫu logo không có nền, chỉ có QR
+        self._compiled = None if template == "logo" else compiled_template(template, format_scale(fmt))
+
+    def payload(self, amount="", note=""):
+        suffix = payload_suffix(note, amount)
+        return f"{self.prefix}{suffix}{crc16_update(self._crc, suffix.encode()):04X}"
+
+    @property
+    def positions(self):
+        if self._positions is None:
+            self._positions = self._compiled.positions(*self._names)
+        return self._positions
+
+    @property
+    def boxes(self):
+        if self._compiled is None:
+            return []
+        return self._compiled.boxes(self.positions)
+
+    def _canvas(self):
+        key = ("merchant", self.template, self._compiled.scale) + self._names
+        return asset_cache.layer(key, lambda: self._compiled.canvas(*self._names))
+
+    def background(self):
+        if self._compiled is None:
+            return None
+        return encode_image(self._compiled.rotated(self._canvas()), self.fmt)
+
+    def render(self, amount="", note=""):
+        data = self.payload(amount, note)
+        if self._compiled is None:
+            return generate_qr_with_logo(data, self.fmt)
+        return self._compiled.render_on(self._canvas(), self.positions, data, self.fmt)
+
+    def tile(self, amount="", note=""):
+        data = self.payload(amount, note)
+        if self._compiled is None:
+            return generate_qr_with_logo(data, self.fmt)
+        return self._compiled.tile(data, self.fmt)
+
+
+@lru_cache(maxsize=PLAN_CACHE)
+def merchant_plan(template, account, bank_bin=BIDV_BIN, acc_name="", store_name="", support_name="",
+                  support_phone="", fmt="png"):
+    return MerchantPlan(template, account, bank_bin, acc_name, store_name, support_name, support_phone, fmt)
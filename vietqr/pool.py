@@ -0,0 +1,52 @@
+import contextvars, os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from vietqr.cache import render_cached
+
+# ======== Pool vẽ ảnh dùng chung cho mọi phiên ========
+# Phần lớn thời gian vẽ là Pillow (resize, paste, nén PNG) vốn nhả GIL, nên
+# chạy các mẫu song song trên thread. Pool được tạo một lần cho cả tiến trình
+# nên tổng số thread luôn bị chặn, dù có bao nhiêu người dùng cùng lúc.
+# Ảnh đã vẽ trước đó được lấy lại từ render_cache.
+
+RENDER_WORKERS = int(os.environ.get("VIETQR_RENDER_WORKERS", min(6, os.cpu_count() or 1)))
+# Đọc ảnh hàng loạt trên giao diện web (vietqr.scan): mọi lần bấm, mọi phiên dùng chung
+SCAN_WORKERS = int(os.environ.get("VIETQR_SCAN_WORKERS", min(4, os.cpu_count() or 1)))
+
+render_pool = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="vietqr-render")
+scan_pool = ThreadPoolExecutor(max_workers=SCAN_WORKERS, thread_name_prefix="vietqr-scan")
+
+_END = object()
+
+
+def render_concurrently(templates, data, *args, fmt="png"):
+    # Trả về (mẫu, buffer, lỗi) theo thứ tự mẫu nào xong trước
+    # Mỗi việc chạy trong bản sao context của người gọi, để vietqr.trace gom được vào request đang đo
+    futures = {
+        render_pool.submit(contextvars.copy_context().run, render_cached, t, data, *args, fmt=fmt): t
+        for t in templates
+    }
+    for future in as_completed(futures):
+        try:
+            yield futures[future], future.result(), None
+        except Exception as e:
+            yield futures[future], None, e
+
+
+def bounded_map(pool, fn, items, window):
+    # fn(item) trên pool, tối đa `window` việc chưa xong cùng lúc để không đọc hết
+    # đầu vào vào bộ nhớ; trả về kết quả theo thứ tự việc nào xong trước
+    items = iter(items)
+    pending = set()
+    exhausted = False
+    while True:
+        while not exhausted and len(pending) < window:
+            item = next(items, _END)
+            if item is _END:
+                exhausted = True
+            else:
+                pending.add(pool.submit(fn, item))
+        if not pending:
+            return
+        finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in finished:
+            yield future.result()
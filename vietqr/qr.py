@@ -0,0 +1,197 @@
+import os
+from collections import namedtuple
+from functools import lru_cache
+import qrcode
+from qrcode import util
+from PIL import Image, ImageDraw
+
+# ======== Mã hoá QR một lần cho mỗi payload ========
+# Chọn version và mask là phần tốn kém nhất của qrcode; ma trận module được
+# nhớ theo payload nên 6 mẫu cùng dùng chung một lần mã hoá, mỗi mẫu chỉ còn
+# việc vẽ ra ảnh theo kích thước/border riêng (rasterize).
+#
+# Thay cho qr.make(fit=True) (8 lần đặt dữ liệu + chấm điểm bằng Python thuần):
+#   - version: qrcode tách payload thành các đoạn (số/chữ-số/byte); số bit cần
+#     chỉ phụ thuộc (chế độ, độ dài) của từng đoạn, nên version được nhớ theo đó
+#   - bố cục của mỗi version (module cố định, thứ tự đặt bit dữ liệu, 8 mẫu
+#     mask) tính một lần; dữ liệu của payload được đặt một lần bằng NumPy
+#   - 8 mask được chấm điểm cùng lúc bằng NumPy, đúng 4 luật phạt của
+#     qrcode.util.lost_point, nên chọn cùng mask và ra ma trận giống hệt qrcode
+# VIETQR_QR_MASK=0..7 dùng cố định một mask, bỏ qua bước chấm điểm (mã vẫn
+# đúng chuẩn, chỉ có thể khác ảnh so với mask tự chọn).
+
+QRMatrix = namedtuple("QRMatrix", ["size", "modules"])  # modules: bytes n*n, 1 = ô đen
+
+ERROR_CORRECTION = qrcode.constants.ERROR_CORRECT_H
+QR_MASK = int(os.environ["VIETQR_QR_MASK"]) if os.environ.get("VIETQR_QR_MASK", "").strip() else None
+if QR_MASK is not None and not 0 <= QR_MASK <= 7:
+    raise ValueError(f"VIETQR_QR_MASK phải từ 0 tới 7: {QR_MASK}")
+
+_versions = {}  # ((chế độ, độ dài) của từng đoạn) -> version
+_VERSIONS_MAX = 4096
+
+_FINDER_LIKE = (0b10111010000, 0b00001011101)  # luật 3: 1011101 có 4 ô trắng phía trước/sau
+
+
+def _version(qr):
+    key = tuple((chunk.mode, len(chunk)) for chunk in qr.data_list)
+    version = _versions.get(key)
+    if version is None:
+        version = qr.best_fit()
+        if len(_versions) >= _VERSIONS_MAX:
+            _versions.clear()
+        _versions[key] = version
+    return version
+
+
+@lru_cache(maxsize=None)
+def _layout(version):
+    # (module cố định khi chấm điểm, module cố định theo từng mask, ô dữ liệu,
+    #  vị trí ô dữ liệu theo thứ tự đặt bit, 8 mẫu mask) - như QRCode.makeImpl/map_data
+    import numpy as np
+    n = version * 4 + 17
+    qr = qrcode.QRCode(version=version, error_correction=ERROR_CORRECTION, border=0)
+    qr.modules_count = n
+    qr.modules = [[None] * n for _ in range(n)]
+    qr.setup_position_probe_pattern(0, 0)
+    qr.setup_position_probe_pattern(n - 7, 0)
+    qr.setup_position_probe_pattern(0, n - 7)
+    qr.setup_position_adjust_pattern()
+    qr.setup_timing_pattern()
+    blank = qr.modules
+
+    def fixed(test, mask):
+        qr.modules = [row[:] for row in blank]
+        qr.setup_type_info(test, mask)
+        if version >= 7:
+            qr.setup_type_number(test)
+        return qr.modules
+
+    test = fixed(True, 0)
+    is_data = np.array([[cell is None for cell in row] for row in test])
+    to_array = lambda modules: np.array([[bool(cell) for cell in row] for row in modules])
+    final = np.stack([to_array(fixed(False, mask)) for mask in range(8)])
+
+    order = []
+    row, step = n - 1, -1
+    for col in range(n - 1, 0, -2):
+        if col <= 6:
+            col -= 1
+        while 0 <= row < n:
+            for c in (col, col - 1):
+                if is_data[row, c]:
+                    order.append(row * n + c)
+            row += step
+        row -= step
+        step = -step
+
+    i, j = np.indices((n, n))
+    masks = np.stack([
+        (i + j) % 2 == 0, i % 2 == 0, j % 3 == 0, (i + j) % 3 == 0,
+        (i // 2 + j // 3) % 2 == 0, (i * j) % 2 + (i * j) % 3 == 0,
+        ((i * j) % 2 + (i * j) % 3) % 2 == 0, ((i * j) % 3 + (i + j) % 2) % 2 == 0,
+    ])
+    return to_array(test), final, is_data, np.array(order), masks
+
+
+def _run_penalty(lines):
+    # Luật 1: mỗi đoạn >= 5 ô cùng màu liên tiếp bị phạt (độ dài - 2); trả về theo từng dòng
+    import numpy as np
+    rows, n = lines.shape
+    edges = np.ones((rows, n + 1), bool)
+    edges[:, 1:n] = lines[:, 1:] != lines[:, :-1]
+    line, pos = np.nonzero(edges)
+    length = np.diff(pos)
+    start = line[:-1]
+    keep = length >= 5  # gồm cả loại bỏ các bước nhảy sang dòng sau (độ dài âm)
+    return np.bincount(start[keep], weights=length[keep] - 2, minlength=rows)
+
+
+def _lost_points(candidates):
+    # Điểm phạt của 8 ma trận (8, n, n) cùng lúc, giống hệt qrcode.util.lost_point
+    import numpy as np
+    count, n, _ = candidates.shape
+    lines = np.concatenate([candidates, candidates.transpose(0, 2, 1)], axis=1).reshape(-1, n)
+    points = _run_penalty(lines).reshape(count, 2 * n).sum(axis=1).astype(np.int64)
+
+    a = candidates[:, :-1, :-1]
+    same = (a == candidates[:, :-1, 1:]) & (a == candidates[:, 1:, :-1]) & (a == candidates[:, 1:, 1:])
+    points += 3 * same.sum(axis=(1, 2))
+
+    # Mỗi cửa sổ 11 ô thành một số 11 bit (ô đầu là bit cao nhất)
+    windows = np.zeros((lines.shape[0], n - 10), np.int16)
+    for k in range(11):
+        windows |= lines[:, k:n - 10 + k].astype(np.int16) << (10 - k)
+    finder_like = (windows == _FINDER_LIKE[0]) | (windows == _FINDER_LIKE[1])
+    points += 40 * finder_like.reshape(count, -1).sum(axis=1)
+
+    for k, dark in enumerate(candidates.sum(axis=(1, 2)).tolist()):
+        percent = float(dark) / (n ** 2)
+        points[k] += int(abs(percent * 100 - 50) / 5) * 10
+    return points
+
+
+@lru_cache(maxsize=256)
+def encode_matrix(data):
+    import numpy as np
+    qr = qrcode.QRCode(error_correction=ERROR_CORRECTION, border=0)
+    qr.add_data(data)
+    version = _version(qr)
+    test, final, is_data, order, masks = _layout(version)
+
+    bits = np.unpackbits(np.array(util.create_data(version, ERROR_CORRECTION, qr.data_list), np.uint8))
+    n = version * 4 + 17
+    placed = np.zeros(len(order), bool)
+    used = min(len(bits), len(order))
+    placed[:used] = bits[:used]
+    raw = np.zeros(n * n, bool)
+    raw[order] = placed
+    raw = raw.reshape(n, n)
+
+    if QR_MASK is None:
+        mask = int(np.argmin(_lost_points(np.where(is_data, raw ^ masks, test))))
+    else:
+        mask = QR_MASK
+    modules = np.where(is_data, raw ^ masks[mask], final[mask])
+    return QRMatrix(n, modules.astype(np.uint8).tobytes())
+
+
+# ======== Vẽ ma trận module thẳng ra ảnh đúng kích thước ========
+# Mỗi module là một khối k×k điểm ảnh, k nguyên lớn nhất vừa khung (tính cả
+# `border` module lề trắng); phần dư chia đều hai bên thành lề trắng. Không
+# qua ảnh trung gian, không nội suy nên cạnh module luôn sắc. Bo góc (kênh
+# alpha) và logo (trộn alpha ở giữa khung) làm luôn trên cùng một mảng.
+
+@lru_cache(maxsize=32)
+def _corner_mask(width, height, radius):
+    import numpy as np
+    mask = Image.new("L", (width, height), 0)
+    ImageDraw.Draw(mask).rounded_rectangle([0, 0, width, height], radius=radius, fill=255)
+    return np.asarray(mask)
+
+
+def rasterize(matrix, size, border=0, radius=0, logo=None):
+    import numpy as np  # nạp ở lần vẽ đầu tiên, không làm chậm lúc khởi động app
+    width, height = size
+    n = matrix.size
+    k = min(width, height) // (n + 2 * border)
+    if k < 1:
+        raise ValueError(f"Khung QR {width}x{height} quá nhỏ cho mã {n}x{n} module")
+    side = n * k
+    x0, y0 = (width - side) // 2, (height - side) // 2
+
+    out = np.full((height, width, 4), 255, np.uint8)
+    luma = 255 - np.frombuffer(matrix.modules, np.uint8).reshape(n, n) * np.uint8(255)
+    # Ghi từng khối k×k qua view 5 chiều, không tạo ảnh phóng to trung gian
+    out[y0:y0 + side, x0:x0 + side, :3].reshape(n, k, n, k, 3)[...] = luma[:, None, :, None, None]
+    if radius:
+        out[..., 3] = _corner_mask(width, height, radius)
+    if logo is not None:
+        src = np.asarray(logo, np.uint16)
+        lh, lw = src.shape[:2]
+        lx, ly = (width - lw) // 2, (height - lh) // 2
+        region = out[ly:ly + lh, lx:lx + lw, :3]
+        alpha = src[..., 3:]
+        region[...] = (src[..., :3] * alpha + region * (255 - alpha) + 127) // 255
+    return Image.fromarray(out, "RGBA")
+
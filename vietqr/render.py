@@ -0,0 +1,179 @@
+import threading
+from vietqr import trace
+from vietqr.assets import (
+    asset_cache, LOGO_PATH, FONT_PATH, FONT_LABELPATH,
+    BG_PATHFIX, BG_PATH, BG_THAI_PATH, BG_LOA_PATH, BG_TINGBOX_PATH,
+)
+from vietqr.engine import compile_template
+from vietqr.output import encode_image, format_scale
+from vietqr.qr import encode_matrix, rasterize
+
+# Tăng khi thay đổi cách vẽ để ảnh đã cache (bộ nhớ, đĩa) không còn được dùng lại
+RENDER_VERSION = 2
+
+TEAL = (0, 102, 102)
+RED = (255, 0, 0)
+
+# Dòng cán bộ hỗ trợ, căn trái sát đáy nền (dùng chung cho mẫu mèo thần tài và thần tài)
+SUPPORT_LINE = {
+    "type": "support", "when": ["support"], "at": (70, -92), "font": (FONT_LABELPATH, 34),
+    "prefix": "Cán bộ hỗ trợ: ", "separator": " - Liên hệ: ", "label_fill": TEAL, "fill": RED,
+}
+
+# ======== Khai báo các mẫu ảnh QR ========
+TEMPLATE_SPECS = {
+    "text": {
+        "background": BG_PATHFIX, "pad": 100, "rotate": -90,
+        "qr": {"border": 0, "columns": 2, "width_ratio": 0.85, "logo_width_ratio": 0.2,
+               "center": {"top": 100, "gap": 20}},
+        "slots": [
+            {"type": "caption", "text": "Quét mã QR để thanh toán", "font": (FONT_PATH, 60), "fill": TEAL,
+             "offset": -100},
+            {"type": "fields", "top": 20, "align": "qr", "max_width": "qr",
+             "label_font": (FONT_LABELPATH, 46), "label_fill": "black", "label_advance": 61,
+             "value_font": FONT_PATH, "fill": TEAL,
+             "fields": [
+                 {"field": "acc_name", "label": "Tên tài khoản:", "upper": True,
+                  "size": 40, "min_size": 20, "step": 2, "advance": 35},
+                 {"field": "merchant_id", "label": "Số tài khoản:",
+                  "size": 40, "min_size": 20, "step": 2, "advance": 35},
+             ]},
+        ],
+    },
+    "background": {
+        "background": BG_PATH,
+        "qr": {"border": 2, "size": (540, 540), "radius": 40, "logo": (100, 100),
+               "at": [(460, 936)]},
+        "slots": [
+            {"type": "fields", "top": 130, "align": "canvas", "max_width": 0.7,
+             "label_font": (FONT_LABELPATH, 46), "label_fill": "black", "label_advance": 58,
+             "value_font": FONT_PATH, "fill": TEAL,
+             "fields": [
+                 {"field": "acc_name", "label": "Tên tài khoản:", "upper": True,
+                  "size": 48, "min_size": 12, "step": 1, "advance": 45},
+                 {"field": "merchant_id", "label": "Số tài khoản:",
+                  "size": 46, "min_size": 12, "step": 1, "advance": 55},
+             ]},
+            SUPPORT_LINE,
+            # Tên cửa hàng chỉ hiện khi có chọn cán bộ hỗ trợ
+            {"type": "text", "field": "store_name", "upper": True, "when": ["support"],
+             "align": "canvas", "y": 265, "font": (FONT_PATH, 70), "fill": "#007C71"},
+        ],
+    },
+    "thantai": {
+        "background": BG_THAI_PATH,
+        "qr": {"border": 0, "size": (480, 520), "logo": (100, 100), "at": [(793, 725)]},
+        "slots": [
+            {"type": "fields", "top": 360, "align": "canvas", "max_width": 0.7,
+             "label_font": (FONT_LABELPATH, 46), "label_fill": "black", "label_advance": 58,
+             "value_font": FONT_PATH, "fill": TEAL,
+             "fields": [
+                 {"field": "acc_name", "label": "Tên tài khoản:", "upper": True,
+                  "size": 48, "min_size": 12, "step": 1, "advance": 45},
+                 {"field": "merchant_id", "label": "Số tài khoản:",
+                  "size": 46, "min_size": 12, "step": 1, "advance": 35},
+             ]},
+            SUPPORT_LINE,
+            {"type": "text", "field": "store_name", "upper": True,
+             "align": "canvas", "y": 265, "font": (FONT_PATH, 70), "fill": "#007C71"},
+        ],
+    },
+    "loa": {
+        "background": BG_LOA_PATH,
+        "qr": {"border": 0, "size": (560, 560), "logo": (100, 100), "at": [(175, 285)]},
+        "slots": [
+            {"type": "fields", "top": 20, "align": "qr", "max_width": "qr",
+             "label_font": (FONT_LABELPATH, 28), "label_fill": "black", "label_advance": 36,
+             "value_font": FONT_PATH, "fill": TEAL,
+             "fields": [
+                 {"field": "acc_name", "label": "Tên tài khoản:", "upper": True,
+                  "size": 32, "min_size": 20, "step": 2, "advance": 15},
+                 {"field": "merchant_id", "label": "Số tài khoản:",
+                  "size": 32, "min_size": 20, "step": 2, "advance": 20},
+             ]},
+            {"type": "text", "field": "support_name", "at": (500, 1138), "font": (FONT_LABELPATH, 32), "fill": TEAL},
+            {"type": "text", "field": "support_phone", "at": (570, 1175), "font": (FONT_LABELPATH, 32), "fill": TEAL},
+        ],
+    },
+    "tingbox": {
+        "background": BG_TINGBOX_PATH,
+        "qr": {"border": 0, "size": (460, 460), "logo": (100, 100), "at": [(202, 395)]},
+        "slots": [
+            {"type": "fields", "top": 20, "align": "qr", "max_width": "qr", "value_font": FONT_PATH, "fill": TEAL,
+             "fields": [
+                 {"field": "merchant_id", "size": 32, "min_size": 12, "step": 1, "advance": 0},
+             ]},
+        ],
+    },
+}
+
+# Mẫu được biên dịch một lần cho cả tiến trình (mỗi tỉ lệ một bản), ở lần dùng đầu tiên
+_compiled = {}
+_compile_lock = threading.Lock()
+
+
+def compiled_template(name, scale=1.0):
+    template = _compiled.get((name, scale))
+    if template is None:
+        with _compile_lock:
+            template = _compiled.get((name, scale))
+            if template is None:
+                template = _compiled[name, scale] = compile_template(TEMPLATE_SPECS[name], scale)
+    return template
+
+
+# ======== Các mẫu ảnh QR ========
+def generate_qr_with_logo(data, fmt="png"):
+    with trace.span("qr_encode"):
+        matrix = encode_matrix(data)
+    with trace.span("qr_compose"):
+        side = (matrix.size + 4) * max(1, round(10 * format_scale(fmt)))
+        logo = asset_cache.logo(LOGO_PATH, (int(side*0.15), int(side*0.15)))
+        img = rasterize(matrix, (side, side), border=2, logo=logo)
+    return encode_image(img, fmt)
+def create_qr_with_text(data, acc_name, merchant_id, fmt="png"):
+    return compiled_template("text", format_scale(fmt)).render(data, acc_name, merchant_id, fmt=fmt)
+
+def create_qr_with_background(data, acc_name, merchant_id, store_name, support_name="", support_phone="", fmt="png"):
+    return compiled_template("background", format_scale(fmt)).render(data, acc_name, merchant_id, store_name, support_name, support_phone, fmt)
+
+def create_qr_with_background_thantai(data, acc_name, merchant_id, store_name, support_name="", support_phone="", fmt="png"):
+    return compiled_template("thantai", format_scale(fmt)).render(data, acc_name, merchant_id, store_name, support_name, support_phone, fmt)
+
+def create_qr_with_background_loa(data, acc_name, merchant_id, store_name="", support_name="", support_phone="", fmt="png"):
+    return compiled_template("loa", format_scale(fmt)).render(data, acc_name, merchant_id, store_name, support_name, support_phone, fmt)
+
+def create_qr_tingbox(data, merchant_id, fmt="png"):
+    return compiled_template("tingbox", format_scale(fmt)).render(data, merchant_id=merchant_id, fmt=fmt)
+
+# ======== Danh sách mẫu, gọi theo tên (tạo hàng loạt, API) ========
+TEMPLATES = {
+    "logo": "Mẫu 1: QR có logo",
+    "text": "Mẫu 2: QR có chữ",
+    "background": "Mẫu 3: QR mèo thần tài",
+    "thantai": "Mẫu 4: QR thần tài",
+    "loa": "Mẫu 5: QR nền loa thanh toán",
+    "tingbox": "Mẫu 6: QR Tingbox",
+}
+
+
+def render_template(template, data, acc_name="", merchant_id="", store_name="", support_name="", support_phone="",
+                    fmt="png"):
+    with trace.template(template):
+        return _render_template(template, data, acc_name, merchant_id, store_name, support_name, support_phone, fmt)
+
+
+def _render_template(template, data, acc_name, merchant_id, store_name, support_name, support_phone, fmt):
+    if template == "logo":
+        return generate_qr_with_logo(data, fmt)
+    if template == "text":
+        return create_qr_with_text(data, acc_name, merchant_id, fmt)
+    if template == "background":
+        return create_qr_with_background(data, acc_name, merchant_id, store_name, support_name, support_phone, fmt)
+    if template == "thantai":
+        return create_qr_with_background_thantai(data, acc_name, merchant_id, store_name, support_name, support_phone, fmt)
+    if template == "loa":
+        return create_qr_with_background_loa(data, acc_name, merchant_id, store_name, support_name, support_phone, fmt)
+    if template == "tingbox":
+        return create_qr_tingbox(data, merchant_id, fmt)
+    raise ValueError(f"Không có mẫu '{template}'. Các mẫu: {', '.join(TEMPLATES)}")
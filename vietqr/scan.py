@@ -0,0 +1,144 @@
+import argparse, csv, io, os, sys, time, zipfile
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from vietqr.banks import BIDV_BIN, bank_name
+from vietqr.decode import decode_qr_multi
+from vietqr.pool import bounded_map
+from vietqr.tlv import parse_vietqr
+
+# ======== Đọc ảnh QR hàng loạt ========
+# Nhận nhiều ảnh, thư mục hoặc file ZIP ảnh QR của merchant (chuyển đổi dữ
+# liệu từ chi nhánh), đọc từng ảnh trên pool thread (OpenCV nhả GIL khi dò mã),
+# mỗi ảnh có thể có nhiều mã. Kết quả là một bảng (tài khoản, BIN, ngân hàng,
+# tên merchant, nội dung, số tiền, trạng thái) xuất được ra CSV.
+#
+#   python -m vietqr.scan anh_qr.zip thu_muc_anh/ -o ket_qua.csv -j 4
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".webp", ".bmp")
+
+COLUMNS = ["file", "account", "bank_bin", "bank_name", "name", "note", "amount", "status"]
+ScanRow = namedtuple("ScanRow", COLUMNS)
+ScanReport = namedtuple("ScanReport", ["files", "codes", "errors", "seconds", "rows"])
+
+STATUS_OK = "OK"
+
+
+def _is_image(name):
+    return name.lower().endswith(IMAGE_EXTS) and not os.path.basename(name).startswith(".")
+
+
+def iter_zip(name, fileobj):
+    with zipfile.ZipFile(fileobj) as zf:
+        for info in zf.infolist():
+            if not info.is_dir() and _is_image(info.filename):
+                yield f"{name}/{info.filename}", zf.read(info)
+
+
+def iter_paths(paths):
+    # Sinh (tên, bytes) cho từng ảnh trong các file, thư mục (đệ quy) và file ZIP
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for f in sorted(files):
+                    if _is_image(f):
+                        yield from iter_paths([os.path.join(root, f)])
+        elif path.lower().endswith(".zip"):
+            with open(path, "rb") as f:
+                yield from iter_zip(os.path.basename(path), f)
+        else:
+            with open(path, "rb") as f:
+                yield path, f.read()
+
+
+def scan_image(name, data):
+    # Một ảnh -> một hoặc nhiều dòng kết quả
+    try:
+        results = decode_qr_multi(data)
+    except Exception as e:
+        return [ScanRow(name, "", "", "", "", "", "", f"Lỗi đọc ảnh: {e}")]
+    rows = []
+    for result in results:
+        if not result.data:
+            status = (f"QR không đúng chuẩn VietQR: {result.rejected[:80]}" if result.rejected
+                      else "Không đọc được QR")
+            rows.append(ScanRow(name, "", "", "", "", "", "", status))
+            continue
+        qr = parse_vietqr(result.data)  # đã được kiểm tra (và cache) lúc đọc ảnh
+        if not qr.crc_valid:
+            status = "Sai mã kiểm tra CRC"
+        elif qr.bank_bin != BIDV_BIN:
+            status = "Không phải QR BIDV"
+        else:
+            status = STATUS_OK
+        rows.append(ScanRow(name, qr.account, qr.bank_bin, bank_name(qr.bank_bin), qr.name, qr.note, qr.amount, status))
+    return rows
+
+
+def _scan_task(item):
+    index, (name, data) = item
+    return index, scan_image(name, data)
+
+
+def run_scan(items, workers=None, progress=None, pool=None):
+    # items: (tên, bytes) như iter_paths(); giữ tối đa workers × 4 ảnh trong bộ nhớ.
+    # pool: executor dùng chung (giao diện web dùng vietqr.pool.scan_pool với
+    # workers = SCAN_WORKERS); không có thì tạo pool riêng cho lần chạy này
+    workers = workers or os.cpu_count() or 1
+    if pool is None:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vietqr-scan") as own:
+            return run_scan(items, workers, progress, own)
+
+    files = codes = 0
+    rows = []
+    start = time.perf_counter()
+    for index, result in bounded_map(pool, _scan_task, enumerate(items), workers * 4):
+        files += 1
+        codes += sum(1 for r in result if r.account)
+        rows.extend((index, r) for r in result)
+        if progress:
+            progress(files, codes, time.perf_counter() - start)
+
+    rows = [r for _, r in sorted(rows, key=lambda x: x[0])]  # giữ thứ tự file đầu vào
+    errors = sum(1 for r in rows if r.status != STATUS_OK)
+    return ScanReport(files, codes, errors, time.perf_counter() - start, rows)
+
+
+def write_csv(rows, f):
+    writer = csv.writer(f)
+    writer.writerow(COLUMNS)
+    writer.writerows(rows)
+
+
+def to_csv_bytes(rows):
+    buf = io.StringIO()
+    write_csv(rows, buf)
+    return buf.getvalue().encode("utf-8-sig")  # BOM để Excel đọc đúng tiếng Việt
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Đọc hàng loạt ảnh QR VietQR (ảnh, thư mục, ZIP) ra file CSV")
+    parser.add_argument("inputs", nargs="+", help="file ảnh, thư mục hoặc file ZIP")
+    parser.add_argument("-o", "--output", default="vietqr_scan.csv", help="file CSV kết quả")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="số thread (mặc định: số CPU)")
+    args = parser.parse_args(argv)
+
+    def progress(files, codes, elapsed):
+        rate = files / elapsed if elapsed else 0.0
+        print(f"\r{files} ảnh, {codes} mã, {rate:.1f} ảnh/s", end="", file=sys.stderr)
+
+    report = run_scan(iter_paths(args.inputs), args.workers, progress)
+    print(file=sys.stderr)
+    with open(args.output, "wb") as f:
+        f.write(to_csv_bytes(report.rows))
+    for row in report.rows:
+        if row.status != STATUS_OK:
+            print(f"❌ {row.file}: {row.status}", file=sys.stderr)
+    rate = report.files / report.seconds if report.seconds else 0.0
+    print(f"✅ {report.files} ảnh, {report.codes} mã, {report.errors} lỗi, "
+          f"{report.seconds:.1f}s, {rate:.1f} ảnh/s -> {args.output}")
+    return 1 if report.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
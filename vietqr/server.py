@@ -0,0 +1,345 @@
+import argparse, json, os, signal, sys, threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from vietqr.assets import asset_cache
+from vietqr.atlas import open_atlas
+from vietqr.banks import BIDV_BIN, bank_name
+from vietqr.cache import render_cache, render_cached, render_key
+from vietqr.decode import decode_qr, decode_qr_multi, decode_stats
+from vietqr.output import FORMATS, encode_stats
+from vietqr.payload import build_vietqr_payload, clean_amount_input, sanitize_input
+from vietqr.plan import merchant_plan
+from vietqr.render import TEMPLATES
+from vietqr.staff import lookup_staff
+from vietqr.tlv import parse_vietqr
+
+# ======== Dịch vụ HTTP tạo/đọc ảnh QR (không cần Streamlit) ========
+# Cho máy POS/CRM gọi thẳng, chỉ dùng thư viện chuẩn:
+#
+#   GET  /payload?account=...&bank_bin=...&note=...&amount=...   -> JSON payload
+#   GET  /render/<mẫu>?account=...&name=...&store=...&staff=...&format=png
+#   GET  /merchant/<mẫu>?account=...&name=...&store=...&staff=...  -> nền, khung QR trống
+#   GET  /merchant/<mẫu>/qr?account=...&amount=...&note=...          -> chỉ ảnh QR
+#   POST /decode[?multi=1]   (thân request là file ảnh)           -> JSON
+#   GET  /templates, GET /health
+#
+#   python -m vietqr.server --port 8080 -j 4 -p 2
+#
+# Số việc vẽ/đọc chạy cùng lúc bị chặn (-j); request vượt quá phải xếp hàng,
+# hàng đợi đầy thì trả 503 kèm Retry-After. Ảnh có ETag là khoá cache theo
+# nội dung (render_key): gửi lại If-None-Match trùng thì trả 304, không vẽ;
+# HEAD cũng chỉ trả header, không vẽ.
+# Với -p > 1, các tiến trình con dùng chung socket để tận dụng nhiều lõi.
+#
+# Máy POS/Tingbox tạo QR cho từng giao dịch nên dùng /merchant (xem vietqr.plan):
+# tải nền một lần (có ETag), header X-QR-Boxes cho biết các ô "x,y,rộng,cao"
+# (cách nhau bởi ";") để dán ảnh QR lấy từ /merchant/<mẫu>/qr mỗi giao dịch.
+
+MAX_UPLOAD = int(os.environ.get("VIETQR_SERVER_MAX_UPLOAD_MB", 20)) * 1024 * 1024
+QUEUE_TIMEOUT = int(os.environ.get("VIETQR_SERVER_QUEUE_TIMEOUT_S", 30))
+
+
+class Busy(Exception):
+    pass
+
+
+class Limiter:
+    # Tối đa `workers` việc chạy cùng lúc và `queue` việc chờ; quá thì báo bận
+    def __init__(self, workers, queue):
+        self.workers = workers
+        self.queue = queue
+        self._slots = threading.BoundedSemaphore(workers)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    @contextmanager
+    def slot(self, timeout=QUEUE_TIMEOUT):
+        with self._lock:
+            if self.waiting >= self.queue:
+                self.rejected += 1
+                raise Busy()
+            self.waiting += 1
+        try:
+            acquired = self._slots.acquire(timeout=timeout)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        if not acquired:
+            with self._lock:
+                self.rejected += 1
+            raise Busy()
+        with self._lock:
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.active -= 1
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {"workers": self.workers, "queue": self.queue, "active": self.active,
+                    "waiting": self.waiting, "rejected": self.rejected}
+
+
+def _param(query, name, default=""):
+    return query.get(name, [default])[0].strip()
+
+
+def _account(query):
+    account = sanitize_input(_param(query, "account"))
+    if not account:
+        raise ValueError("Thiếu số tài khoản (account)")
+    return account, sanitize_input(_param(query, "bank_bin", BIDV_BIN))
+
+
+def _amount(query):
+    raw_amount = _param(query, "amount")
+    amount = clean_amount_input(raw_amount)
+    if amount is None:
+        raise ValueError(f"Số tiền không hợp lệ: {raw_amount}")
+    return amount
+
+
+def payload_from_query(query):
+    account, bank_bin = _account(query)
+    return build_vietqr_payload(account, bank_bin, _param(query, "note"), _amount(query)), account
+
+
+def render_args(query):
+    # (payload, tên, tài khoản, cửa hàng, cán bộ, SĐT) theo thứ tự của render_cached
+    data, account = payload_from_query(query)
+    staff_name, staff_phone = lookup_staff(_param(query, "staff"))
+    return data, _param(query, "name"), account, _param(query, "store"), staff_name, staff_phone
+
+
+def plan_args(query):
+    # (tài khoản, BIN, tên, cửa hàng, cán bộ, SĐT) theo thứ tự của merchant_plan
+    account, bank_bin = _account(query)
+    staff_name, staff_phone = lookup_staff(_param(query, "staff"))
+    return account, bank_bin, _param(query, "name"), _param(query, "store"), staff_name, staff_phone
+
+
+def etag_matches(if_none_match, etag):
+    # So sánh yếu như If-None-Match yêu cầu: bỏ tiền tố W/, "*" khớp mọi ảnh
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in [t[2:] if t.startswith("W/") else t for t in tags]
+
+
+def describe(result):
+    out = {"data": result.data, "stage": result.stage, "ms": round(result.seconds * 1000, 1)}
+    if result.data:
+        qr = parse_vietqr(result.data)
+        out.update(qr._asdict(), bank_name=bank_name(qr.bank_bin))
+    elif result.rejected:
+        out["rejected"] = result.rejected
+    return out
+
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = "vietqr"
+    protocol_version = "HTTP/1.1"
+    limiter = None  # gán trong make_server
+
+    # ----- Trả lời -----
+    def _send(self, status, body, content_type, headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _json(self, status, obj, headers=()):
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self._send(status, body, "application/json; charset=utf-8", headers)
+
+    def _error(self, status, message, headers=()):
+        self._json(status, {"error": message}, headers)
+
+    def _dispatch(self, routes):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        parts = [p for p in url.path.split("/") if p]
+        handler = routes.get(parts[0] if parts else "")
+        if handler is None:
+            return self._error(404, f"Không có đường dẫn {url.path}")
+        try:
+            handler(parts[1:], query)
+        except Busy:
+            self._error(503, "Máy chủ đang bận, thử lại sau", [("Retry-After", "1")])
+        except ValueError as e:
+            self._error(400, str(e))
+        except Exception as e:
+            self.log_error("Lỗi xử lý %s: %r", self.path, e)
+            self._error(500, f"Lỗi máy chủ: {e}")
+
+    def do_GET(self):
+        self._dispatch({"payload": self.get_payload, "render": self.get_render, "merchant": self.get_merchant,
+                        "templates": self.get_templates, "health": self.get_health})
+
+    do_HEAD = do_GET
+
+    def do_POST(self):
+        self._dispatch({"decode": self.post_decode})
+
+    # ----- Các endpoint -----
+    def get_payload(self, parts, query):
+        data, _ = payload_from_query(query)
+        self._json(200, {"payload": data})
+
+    def _template_format(self, template, query):
+        if template not in TEMPLATES:
+            raise ValueError(f"Mẫu không hợp lệ. Các mẫu: {', '.join(TEMPLATES)}")
+        fmt = _param(query, "format", "png")
+        if fmt not in FORMATS:
+            raise ValueError(f"Định dạng ảnh không hợp lệ: {fmt}. Các định dạng: {', '.join(FORMATS)}")
+        return template, fmt
+
+    def _without_body(self, content_type, headers):
+        # Trả lời chỉ bằng header nếu được (304 hoặc HEAD), để khỏi vẽ ảnh
+        etag = dict(headers).get("ETag")
+        if etag and etag_matches(self.headers.get("If-None-Match", ""), etag):
+            self.send_response(304)
+            headers = list(headers) + [("Content-Length", "0")]
+        elif self.command == "HEAD":
+            self.send_response(200)
+            headers = [("Content-Type", content_type)] + list(headers)  # chưa vẽ nên không có Content-Length
+        else:
+            return False
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        return True
+
+    def get_render(self, parts, query):
+        if len(parts) != 1:
+            raise ValueError(f"Mẫu không hợp lệ. Các mẫu: {', '.join(TEMPLATES)}")
+        template, fmt = self._template_format(parts[0], query)
+        args = render_args(query)
+        headers = [("ETag", f'"{render_key(template, *args, fmt=fmt)}"'), ("Cache-Control", "public, max-age=86400")]
+        if self._without_body(FORMATS[fmt]["mime"], headers):
+            return
+        with self.limiter.slot():
+            image = render_cached(template, *args, fmt=fmt).getvalue()
+        self._send(200, image, FORMATS[fmt]["mime"], headers)
+
+    def get_merchant(self, parts, query):
+        if not parts or parts[1:] not in ([], ["qr"]):
+            raise ValueError("Đường dẫn: /merchant/<mẫu> hoặc /merchant/<mẫu>/qr")
+        template, fmt = self._template_format(parts[0], query)
+        if template == "logo":
+            raise ValueError("Mẫu logo không có nền, dùng /render/logo")
+        args = plan_args(query)
+        plan = merchant_plan(template, *args, fmt=fmt)
+        mime = FORMATS[fmt]["mime"]
+        if parts[1:] == ["qr"]:
+            # Mỗi giao dịch một ảnh, không cache
+            note, amount = _param(query, "note"), _amount(query)
+            if self._without_body(mime, [("Cache-Control", "no-store")]):
+                return
+            with self.limiter.slot():
+                image = plan.tile(amount, note).getvalue()
+            return self._send(200, image, mime, [("Cache-Control", "no-store")])
+        # Khoá theo tiền tố payload (chưa có CRC) nên không trùng khoá ảnh của /render
+        account, bank_bin, name, store, staff_name, staff_phone = args
+        etag = f'"{render_key(template, plan.prefix, name, account, store, staff_name, staff_phone, fmt=fmt)}"'
+        boxes = ";".join(",".join(map(str, box)) for box in plan.boxes)
+        headers = [("ETag", etag), ("Cache-Control", "public, max-age=86400"), ("X-QR-Boxes", boxes)]
+        if self._without_body(mime, headers):
+            return
+        with self.limiter.slot():
+            image = plan.background().getvalue()
+        self._send(200, image, mime, headers)
+
+    def get_templates(self, parts, query):
+        self._json(200, {"templates": TEMPLATES, "formats": list(FORMATS)})
+
+    def get_health(self, parts, query):
+        atlas = open_atlas()
+        self._json(200, {"pid": os.getpid(), "limiter": self.limiter.stats(), "render_cache": render_cache.stats(),
+                         "asset_cache": asset_cache.stats(), "atlas": atlas.stats() if atlas else None,
+                         "encode": encode_stats(), "decode": decode_stats()})
+
+    def post_decode(self, parts, query):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length < 0:
+            self.close_connection = True  # không biết thân request dài bao nhiêu, không đọc tiếp được
+            return self._error(400, "Content-Length không hợp lệ")
+        if not length:
+            raise ValueError("Thiếu nội dung ảnh (gửi file ảnh trong thân request)")
+        if length > MAX_UPLOAD:
+            self.close_connection = True
+            return self._error(413, f"Ảnh quá lớn (tối đa {MAX_UPLOAD // (1024 * 1024)} MB)")
+        body = self.rfile.read(length)
+        with self.limiter.slot():
+            if _param(query, "multi") in ("1", "true"):
+                results = decode_qr_multi(body)
+            else:
+                results = [decode_qr(body)]
+        codes = [describe(r) for r in results]
+        self._json(200 if any(c["data"] for c in codes) else 422, {"codes": codes})
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # hàng đợi kết nối của socket (mặc định chỉ 5)
+
+
+def make_server(host="127.0.0.1", port=8080, workers=None, queue=None):
+    workers = workers or os.cpu_count() or 1
+    queue = workers * 16 if queue is None else queue
+    handler = type("VietQRHandler", (Handler,), {"limiter": Limiter(workers, queue)})
+    return Server((host, port), handler)
+
+
+def serve(host="127.0.0.1", port=8080, workers=None, queue=None, processes=1):
+    server = make_server(host, port, workers, queue)
+    children = []
+    if processes > 1 and hasattr(os, "fork"):
+        # Tiến trình con kế thừa socket đang nghe, nhân kernel chia kết nối cho các tiến trình
+        for _ in range(processes - 1):
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    server.serve_forever()
+                finally:
+                    os._exit(0)
+            children.append(pid)
+        # Tắt tiến trình cha (SIGTERM) thì tắt luôn các tiến trình con ở khối finally
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dịch vụ HTTP tạo và đọc ảnh VietQR")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("-j", "--workers", type=int, default=None, help="số việc vẽ/đọc cùng lúc mỗi tiến trình (mặc định: số CPU)")
+    parser.add_argument("-q", "--queue", type=int, default=None, help="số request được xếp hàng chờ (mặc định: 16 × workers)")
+    parser.add_argument("-p", "--processes", type=int, default=1, help="số tiến trình dùng chung cổng")
+    args = parser.parse_args(argv)
+    print(f"VietQR server: http://{args.host}:{args.port} ({args.processes} tiến trình)", file=sys.stderr)
+    serve(args.host, args.port, args.workers, args.queue, args.processes)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,18 @@
+# === Danh sách cán bộ hỗ trợ ===
+STAFF_LIST = {
+    "": ("", ""),
+    "Vũ Hoàng Phát - PGD Tiền Hải": ("Vũ Hoàng Phát", "0986.155.838"),
+    "Lê Thị Liên - PGD Tiền Hải": ("Lê Thị Liên", "0976.239.278"),
+    "Chu Thị Thu Hiền - BIDV Tiền Hải": ("Chu Thị Thu Hiền", "0989.557.699"),
+}
+
+
+def lookup_staff(value):
+    # Nhận cả nhãn đầy đủ trong STAFF_LIST lẫn riêng tên cán bộ
+    value = (value or "").strip()
+    if value in STAFF_LIST:
+        return STAFF_LIST[value]
+    for name, phone in STAFF_LIST.values():
+        if name and name == value:
+            return name, phone
+    raise ValueError(f"Không tìm thấy cán bộ hỗ trợ '{value}'")
@@ -0,0 +1,29 @@
+from functools import lru_cache
+from vietqr.assets import asset_cache
+
+# ======== Tự động chọn cỡ chữ ========
+# Thay cho các vòng lặp get_font giảm 1-2pt mỗi bước: tìm nhị phân trên đúng
+# dãy cỡ chữ mà vòng lặp cũ sẽ thử (base, base-step, ... tới min_size), nên
+# kết quả trùng khớp với cách cũ. Độ rộng chữ được nhớ theo (font, cỡ, chuỗi).
+
+
+@lru_cache(maxsize=8192)
+def text_width(path, size, text):
+    # Bằng draw.textbbox((0, 0), text, font=font)[2] với font tương ứng
+    return asset_cache.font(path, size).getbbox(text)[2]
+
+
+def fit_font_size(path, text, max_width, base_size, min_size=12, step=1):
+    if base_size <= min_size or text_width(path, base_size, text) <= max_width:
+        return base_size
+    # Vòng lặp cũ dừng ở cỡ đầu tiên <= min_size dù chữ vẫn tràn
+    last = -(-(base_size - min_size) // step)
+    lo, hi = 1, last
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if text_width(path, base_size - mid * step, text) <= max_width:
+            hi = mid
+        else:
+            lo = mid + 1
+    return base_size - lo * step
+
@@ -0,0 +1,171 @@
+import argparse, csv, json, sys, time
+from collections import namedtuple
+from functools import lru_cache
+
+from vietqr.crc import crc16_ccitt
+
+# ======== Đọc payload EMVCo / VietQR ========
+# Duyệt payload một lần, chỉ ghi (tag, vị trí, độ dài) của từng phần tử vào
+# một chỉ mục gọn, không cắt chuỗi con. Template lồng nhau
+# (38, 62, ...) chỉ được tách khi cần, trên chính chuỗi gốc. Tag 63 (CRC) được
+# kiểm tra với CRC-16/CCITT của phần đứng trước nó.
+#
+#   python -m vietqr.tlv payloads.jsonl -o loi.csv
+
+# Phương thức khởi tạo (tag 01): 11 = QR tĩnh, 12 = QR động (có số tiền)
+VietQR = namedtuple("VietQR", [
+    "bank_bin", "account", "service", "amount", "currency", "country", "name", "city", "note", "method",
+    "crc", "crc_valid",
+])
+
+
+class TLV:
+    # Chỉ mục các phần tử TLV trong payload[start:end]: tag -> (vị trí value, độ dài)
+    __slots__ = ("payload", "tags", "spans", "_nested")
+
+    def __init__(self, payload, start=0, end=None):
+        end = len(payload) if end is None else end
+        self.payload = payload
+        self.tags = tags = []  # theo thứ tự xuất hiện
+        self.spans = spans = {}  # tag lặp lại thì giữ lần cuối, như parse_tlv cũ
+        self._nested = None
+        i = start
+        while i + 4 <= end:
+            tag = payload[i:i+2]
+            digits = payload[i+2:i+4]
+            # Đúng hai chữ số ASCII: int() còn nhận "-4", "+1", " 1", chữ số Unicode,
+            # độ dài âm làm vòng lặp không tiến
+            if not (digits.isascii() and digits.isdigit()):
+                raise ValueError(f"Lỗi TLV: không thể chuyển '{digits}' thành số nguyên tại vị trí {i}")
+            length = int(digits)
+            i += 4
+            if i + length > end:
+                raise ValueError(f"Lỗi TLV: độ dài value vượt quá payload tại tag {tag}")
+            tags.append(tag)
+            spans[tag] = (i, length)
+            i += length
+
+    def __contains__(self, tag):
+        return tag in self.spans
+
+    def __iter__(self):
+        return iter(self.tags)
+
+    def __len__(self):
+        return len(self.tags)
+
+    def get(self, tag, default=""):
+        span = self.spans.get(tag)
+        if span is None:
+            return default
+        offset, length = span
+        return self.payload[offset:offset + length]
+
+    def nested(self, tag):
+        # Template lồng nhau, tách lần đầu được gọi rồi giữ lại
+        if self._nested is None:
+            self._nested = {}
+        child = self._nested.get(tag)
+        if child is None:
+            span = self.spans.get(tag)
+            if span is None:
+                return None
+            offset, length = span
+            child = self._nested[tag] = TLV(self.payload, offset, offset + length)
+        return child
+
+    def to_dict(self):
+        return {tag: self.get(tag) for tag in self.spans}
+
+
+def check_crc(index):
+    # CRC phải là phần tử cuối, dài 4, tính trên toàn bộ payload tới hết "6304"
+    if not index.tags or index.tags[-1] != "63" or index.spans["63"][1] != 4:
+        return "", False
+    offset = index.spans["63"][0]
+    crc = index.payload[offset:offset + 4]
+    return crc, crc.upper() == crc16_ccitt(index.payload[:offset])
+
+
+def _parse(payload):
+    index = TLV(payload)
+    info = {"bank_bin": "", "account": "", "service": ""}
+    merchant = index.nested("38")
+    if merchant is not None:
+        info["service"] = merchant.get("02")
+        acc = merchant.nested("01")
+        if acc is not None:
+            info["bank_bin"] = acc.get("00")
+            info["account"] = acc.get("01")
+    additional = index.nested("62")
+    crc, crc_valid = check_crc(index)
+    return VietQR(
+        info["bank_bin"], info["account"], info["service"], index.get("54"), index.get("53"), index.get("58"),
+        index.get("59"), index.get("60"), additional.get("08") if additional is not None else "", index.get("01"),
+        crc, crc_valid,
+    )
+
+
+@lru_cache(maxsize=4096)
+def parse_vietqr(payload):
+    # Cache theo payload: kiểm tra lúc đọc ảnh và tách thông tin sau đó chỉ tốn một lần duyệt
+    return _parse(payload)
+
+
+# ----- Kiểm tra hàng loạt, đọc file theo dòng -----
+def iter_payloads(path, column="payload"):
+    # JSONL (chuỗi hoặc object có cột payload), CSV (cột payload) hoặc mỗi dòng một payload
+    lower = path.lower()
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if lower.endswith(".csv"):
+            for row in csv.DictReader(f):
+                yield row.get(column) or ""
+        elif lower.endswith((".jsonl", ".ndjson")):
+            for line in f:
+                if line.strip():
+                    item = json.loads(line)
+                    yield item if isinstance(item, str) else str(item.get(column) or "")
+        else:
+            for line in f:
+                if line.strip():
+                    yield line.strip()
+
+
+def validate_stream(payloads):
+    # Sinh (số thứ tự, VietQR hoặc None, lỗi hoặc None); không giữ cả file trong bộ nhớ
+    for n, payload in enumerate(payloads, 1):
+        try:
+            result = _parse(payload)  # không qua cache, mỗi payload chỉ gặp một lần
+        except ValueError as e:
+            yield n, None, str(e)
+            continue
+        yield n, result, None if result.crc_valid else "Sai mã kiểm tra CRC"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Kiểm tra hàng loạt payload VietQR (JSONL, CSV hoặc mỗi dòng một payload)")
+    parser.add_argument("input", help="file payload")
+    parser.add_argument("-c", "--column", default="payload", help="tên cột payload (CSV/JSONL)")
+    parser.add_argument("-o", "--output", default=None, help="ghi các dòng lỗi ra file CSV")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    total = 0
+    errors = []
+    for n, _, error in validate_stream(iter_payloads(args.input, args.column)):
+        total = n
+        if error:
+            errors.append((n, error))
+    elapsed = time.perf_counter() - start
+    if args.output:
+        with open(args.output, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["row", "error"])
+            writer.writerows(errors)
+    rate = total / elapsed if elapsed else 0.0
+    print(f"✅ {total} payload, {len(errors)} lỗi, {elapsed:.2f}s, {rate:,.0f} payload/s")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
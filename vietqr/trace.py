@@ -0,0 +1,146 @@
+import contextvars, json, os, statistics, threading, time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+# ======== Đo thời gian từng bước vẽ/đọc ảnh ========
+# Bật bằng VIETQR_TRACE=1 (hoặc enable()). Mỗi bước được bọc trong
+# `with span("tên"):`; thời gian được cộng vào:
+#   - request đang chạy (request(), gồm cả các thread vẽ của pool), để xem
+#     một lần bấm nút tốn thời gian ở đâu, theo từng mẫu
+#   - thống kê toàn tiến trình theo (mẫu, bước): số lần, tổng, p50, p95, max
+#     trên SAMPLES lần gần nhất (stats(), export_jsonl())
+# Nếu đặt VIETQR_TRACE_LOG, mỗi request xong được ghi thêm một dòng JSON vào file đó.
+# Khi tắt, span() chỉ trả về một context rỗng dùng chung (~0.4 µs mỗi bước).
+
+ENABLED = os.environ.get("VIETQR_TRACE", "") not in ("", "0")
+LOG_PATH = os.environ.get("VIETQR_TRACE_LOG") or None
+SAMPLES = 2048
+
+_NOOP = nullcontext()
+_request = contextvars.ContextVar("vietqr_trace_request", default=None)
+_template = contextvars.ContextVar("vietqr_trace_template", default="")
+_samples = {}  # (mẫu, bước) -> [số lần, tổng giây, deque các lần gần nhất]
+_lock = threading.Lock()
+
+
+def enabled():
+    return ENABLED
+
+
+def enable(on=True):
+    global ENABLED
+    ENABLED = on
+
+
+class _Span:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.stage, time.perf_counter() - self.start)
+
+
+def span(stage):
+    return _Span(stage) if ENABLED else _NOOP
+
+
+def record(stage, seconds):
+    template = _template.get()
+    spans = _request.get()
+    if spans is not None:
+        spans.append((template, stage, seconds))
+    with _lock:
+        entry = _samples.get((template, stage))
+        if entry is None:
+            entry = _samples[template, stage] = [0, 0.0, deque(maxlen=SAMPLES)]
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2].append(seconds)
+
+
+@contextmanager
+def template(name):
+    # Các bước bên trong được tính cho mẫu `name`
+    if not ENABLED:
+        yield
+        return
+    token = _template.set(name)
+    try:
+        yield
+    finally:
+        _template.reset(token)
+
+
+@contextmanager
+def request(label):
+    # Gom mọi bước chạy bên trong (kể cả thread của pool, xem vietqr.pool) vào một
+    # bản ghi; bản ghi được điền total_ms và spans khi ra khỏi khối with
+    trace = {"request": label}
+    if not ENABLED:
+        yield trace
+        return
+    spans = []
+    token = _request.set(spans)
+    start = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        _request.reset(token)
+        trace.update(
+            ts=time.time(),
+            total_ms=round((time.perf_counter() - start) * 1000, 2),
+            spans=[{"template": t, "stage": s, "ms": round(sec * 1000, 3)} for t, s, sec in spans],
+        )
+        if LOG_PATH:
+            line = json.dumps(trace, ensure_ascii=False)
+            with _lock, open(LOG_PATH, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+def by_template(trace):
+    # {mẫu: {bước: ms}} của một request, cộng dồn các lần lặp lại cùng bước
+    out = {}
+    for s in trace.get("spans", ()):
+        stages = out.setdefault(s["template"] or "-", {})
+        stages[s["stage"]] = round(stages.get(s["stage"], 0.0) + s["ms"], 3)
+    return out
+
+
+def _percentile(sorted_values, q):
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    return statistics.quantiles(sorted_values, n=100, method="inclusive")[q - 1]
+
+
+def stats():
+    with _lock:
+        items = [(key, count, total, sorted(recent)) for key, (count, total, recent) in _samples.items()]
+    rows = []
+    for (template, stage), count, total, recent in sorted(items):
+        rows.append({
+            "template": template or "-", "stage": stage, "count": count,
+            "total_ms": round(total * 1000, 2),
+            "p50_ms": round(_percentile(recent, 50) * 1000, 3),
+            "p95_ms": round(_percentile(recent, 95) * 1000, 3),
+            "max_ms": round(recent[-1] * 1000, 3),
+        })
+    return rows
+
+
+def export_jsonl(f=None):
+    # Mỗi (mẫu, bước) một dòng JSON; trả về chuỗi nếu không truyền file
+    lines = "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in stats())
+    if f is None:
+        return lines
+    f.write(lines)
+
+
+def reset():
+    with _lock:
+        _samples.clear()